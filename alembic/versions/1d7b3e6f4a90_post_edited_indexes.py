@@ -0,0 +1,26 @@
+"""Post edited indexes
+
+Revision ID: 1d7b3e6f4a90
+Revises: c5a9e0f3b812
+Create Date: 2026-10-18 12:41:52.170384+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1d7b3e6f4a90'
+down_revision = 'c5a9e0f3b812'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('post_user_id_edited_idx', 'post', ['user_id', 'edited'])
+    op.create_index('post_edited_idx', 'post', ['edited'])
+
+
+def downgrade():
+    op.drop_index('post_edited_idx', table_name='post')
+    op.drop_index('post_user_id_edited_idx', table_name='post')
@@ -0,0 +1,73 @@
+"""Post rendered content
+
+Revision ID: 3b1f5d2a9c47
+Revises: 0cf78d176fc3
+Create Date: 2026-10-18 09:12:41.508211+00:00
+
+"""
+from io import BytesIO
+from os import environ
+from urllib.parse import quote
+from xml.etree.ElementTree import ElementTree
+import re
+
+from alembic import op
+import sqlalchemy as sa
+import markdown2
+
+
+# revision identifiers, used by Alembic.
+revision = '3b1f5d2a9c47'
+down_revision = '0cf78d176fc3'
+branch_labels = None
+depends_on = None
+
+# Copy of rendering at time of migration, so migration not depend on later changes of application
+TAG_EXTRACTOR = re.compile(r'''#([\w\d_?!]+?)(\s|$)''', re.MULTILINE)
+LINES_FOR_ANNOTATION = int(environ.get('WORDS_LINES_PER_ANNOTATION', 3))
+
+
+def html2plain(html):
+    return ' '.join(ElementTree(file=BytesIO('<body>{}</body>'.format(html).encode('utf8'))).getroot().itertext()).\
+        strip()
+
+
+def render_content(username, content):
+    tag_url = r'''[#\g<1>](/user/{}/tag/\g<1>)\g<2>'''.format(quote(username))
+    annotation = '\n'.join(content.split('\n')[:LINES_FOR_ANNOTATION])
+    content_rendered = markdown2.markdown(TAG_EXTRACTOR.sub(tag_url, content))
+    annotation_rendered = markdown2.markdown(TAG_EXTRACTOR.sub(tag_url, annotation))
+    return content_rendered, annotation_rendered, html2plain(annotation_rendered)
+
+
+def upgrade():
+    op.add_column('post', sa.Column('content_rendered', sa.Text(), nullable=False, server_default=''))
+    op.add_column('post', sa.Column('annotation_rendered', sa.Text(), nullable=False, server_default=''))
+    op.add_column('post', sa.Column('annotation_plain', sa.Text(), nullable=False, server_default=''))
+
+    user = sa.table('user',
+                    sa.column('user_id', sa.Integer),
+                    sa.column('username', sa.String))
+    post = sa.table('post',
+                    sa.column('post_id', sa.Integer),
+                    sa.column('user_id', sa.Integer),
+                    sa.column('content', sa.Text),
+                    sa.column('content_rendered', sa.Text),
+                    sa.column('annotation_rendered', sa.Text),
+                    sa.column('annotation_plain', sa.Text))
+    connection = op.get_bind()
+    rows = connection.execute(sa.select([post.c.post_id, user.c.username, post.c.content]).
+                              select_from(post.join(user, post.c.user_id == user.c.user_id))).fetchall()
+    for post_id, username, content in rows:
+        content_rendered, annotation_rendered, annotation_plain = render_content(username, content)
+        connection.execute(post.update().
+                           where(post.c.post_id == post_id).
+                           values(content_rendered=content_rendered,
+                                  annotation_rendered=annotation_rendered,
+                                  annotation_plain=annotation_plain))
+
+
+def downgrade():
+    op.drop_column('post', 'annotation_plain')
+    op.drop_column('post', 'annotation_rendered')
+    op.drop_column('post', 'content_rendered')
@@ -0,0 +1,36 @@
+"""Repost delivery
+
+Revision ID: 4e8a1f7c6b39
+Revises: b91e6c0d4a53
+Create Date: 2026-10-18 17:46:58.215730+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e8a1f7c6b39'
+down_revision = 'b91e6c0d4a53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('repost_delivery',
+    sa.Column('repost_delivery_id', sa.Integer(), nullable=False),
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('service_subscribe_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=32), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('updated', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['post.post_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['service_subscribe_id'], ['service_subscribe.service_subscribe_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('repost_delivery_id'),
+    sa.UniqueConstraint('post_id', 'service_subscribe_id', name='repost_delivery_post_id_service_subscribe_id_key')
+    )
+
+
+def downgrade():
+    op.drop_table('repost_delivery')
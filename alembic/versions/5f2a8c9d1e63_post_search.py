@@ -0,0 +1,42 @@
+"""Post search
+
+Revision ID: 5f2a8c9d1e63
+Revises: 1d7b3e6f4a90
+Create Date: 2026-10-18 13:35:28.640917+00:00
+
+"""
+from os import environ
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '5f2a8c9d1e63'
+down_revision = '1d7b3e6f4a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('post', sa.Column('search_vector', sa.Text().with_variant(postgresql.TSVECTOR(), 'postgresql'),
+                                    nullable=True))
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute(sa.text("UPDATE post SET search_vector = to_tsvector(:config, title || ' ' || content)").
+                   bindparams(config=environ.get('WORDS_SEARCH_CONFIG', 'simple')))
+        op.create_index('post_search_vector_idx', 'post', ['search_vector'], postgresql_using='gin')
+    elif dialect == 'sqlite':
+        op.execute('CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(title, content)')
+        op.execute('INSERT INTO post_fts(rowid, title, content) SELECT post_id, title, content FROM post')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('post_search_vector_idx', table_name='post')
+    elif dialect == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS post_fts')
+    with op.batch_alter_table('post') as batch_op:
+        batch_op.drop_column('search_vector')
@@ -0,0 +1,33 @@
+"""Logotype upload
+
+Revision ID: 6a1d9f4e2c75
+Revises: d06f3b8e9a21
+Create Date: 2026-10-18 19:42:26.183054+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a1d9f4e2c75'
+down_revision = 'd06f3b8e9a21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('logotype_upload',
+    sa.Column('logotype_upload_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('logotype_upload_id')
+    )
+    op.create_index('logotype_upload_user_id_idx', 'logotype_upload', ['user_id'])
+
+
+def downgrade():
+    op.drop_index('logotype_upload_user_id_idx', table_name='logotype_upload')
+    op.drop_table('logotype_upload')
@@ -0,0 +1,29 @@
+"""Rate limit bucket
+
+Revision ID: 7c3d9a5e2f18
+Revises: e2b8f4a61c07
+Create Date: 2026-10-18 16:27:39.804153+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c3d9a5e2f18'
+down_revision = 'e2b8f4a61c07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('rate_limit_bucket',
+    sa.Column('name', sa.String(length=256), nullable=False),
+    sa.Column('tokens', sa.Float(), nullable=False),
+    sa.Column('updated', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('rate_limit_bucket')
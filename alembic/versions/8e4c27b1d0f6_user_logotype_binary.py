@@ -0,0 +1,52 @@
+"""User logotype binary
+
+Revision ID: 8e4c27b1d0f6
+Revises: 3b1f5d2a9c47
+Create Date: 2026-10-18 10:03:17.226540+00:00
+
+"""
+from base64 import b64encode, b64decode
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4c27b1d0f6'
+down_revision = '3b1f5d2a9c47'
+branch_labels = None
+depends_on = None
+
+
+DATA_URI_PREFIX = 'data:image/jpg;base64,'
+
+
+def convert_logotype(source_type, destination_type, convert):
+    """Move user.logotype to column of other type
+
+    :param source_type: Current column type
+    :param destination_type: New column type
+    :param convert: Function for convert value of current column to value of new column
+    """
+    op.add_column('user', sa.Column('logotype_new', destination_type, nullable=True))
+    user = sa.table('user',
+                    sa.column('user_id', sa.Integer),
+                    sa.column('logotype', source_type),
+                    sa.column('logotype_new', destination_type))
+    connection = op.get_bind()
+    for user_id, logotype in connection.execute(sa.select([user.c.user_id, user.c.logotype])).fetchall():
+        connection.execute(user.update().where(user.c.user_id == user_id).values(logotype_new=convert(logotype)))
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('logotype')
+        batch_op.alter_column('logotype_new', new_column_name='logotype', nullable=False,
+                              existing_type=destination_type)
+
+
+def upgrade():
+    convert_logotype(sa.Text(), sa.LargeBinary(),
+                     lambda logotype: b64decode(logotype.split(',', 1)[-1]))
+
+
+def downgrade():
+    convert_logotype(sa.LargeBinary(), sa.Text(),
+                     lambda logotype: '{}{}'.format(DATA_URI_PREFIX, b64encode(logotype).decode('utf8')))
@@ -0,0 +1,50 @@
+"""User logotype small
+
+Revision ID: a47d0c3e9b25
+Revises: 5f2a8c9d1e63
+Create Date: 2026-10-18 15:02:44.381906+00:00
+
+"""
+from io import BytesIO
+
+from alembic import op
+import sqlalchemy as sa
+from PIL import Image
+
+
+# revision identifiers, used by Alembic.
+revision = 'a47d0c3e9b25'
+down_revision = '5f2a8c9d1e63'
+branch_labels = None
+depends_on = None
+
+# Copy of logotype encoding at time of migration, so migration not depend on later changes of application
+LOGOTYPE_SIZE = (512, 512)
+LOGOTYPE_SMALL_SIZE = (64, 64)
+
+
+def encode_logotype_small(logotype):
+    logotype_buffer = BytesIO()
+    Image.open(BytesIO(logotype)).convert('RGB').resize(LOGOTYPE_SIZE).resize(LOGOTYPE_SMALL_SIZE, Image.LANCZOS).\
+        save(logotype_buffer, 'jpeg', optimize=True)
+    return logotype_buffer.getvalue()
+
+
+def upgrade():
+    op.add_column('user', sa.Column('logotype_small', sa.LargeBinary(), nullable=True))
+    user = sa.table('user',
+                    sa.column('user_id', sa.Integer),
+                    sa.column('logotype', sa.LargeBinary),
+                    sa.column('logotype_small', sa.LargeBinary))
+    connection = op.get_bind()
+    for user_id, logotype in connection.execute(sa.select([user.c.user_id, user.c.logotype])).fetchall():
+        connection.execute(user.update().
+                           where(user.c.user_id == user_id).
+                           values(logotype_small=encode_logotype_small(logotype)))
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.alter_column('logotype_small', nullable=False, existing_type=sa.LargeBinary())
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('logotype_small')
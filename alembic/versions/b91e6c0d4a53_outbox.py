@@ -0,0 +1,30 @@
+"""Outbox
+
+Revision ID: b91e6c0d4a53
+Revises: 7c3d9a5e2f18
+Create Date: 2026-10-18 17:05:12.640317+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b91e6c0d4a53'
+down_revision = '7c3d9a5e2f18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('outbox',
+    sa.Column('outbox_id', sa.Integer(), nullable=False),
+    sa.Column('task', sa.String(length=256), nullable=False),
+    sa.Column('args', sa.JSON(), nullable=False),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('outbox_id')
+    )
+
+
+def downgrade():
+    op.drop_table('outbox')
@@ -0,0 +1,55 @@
+"""Tag count
+
+Revision ID: c5a9e0f3b812
+Revises: 8e4c27b1d0f6
+Create Date: 2026-10-18 11:20:05.913472+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a9e0f3b812'
+down_revision = '8e4c27b1d0f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tag_count = op.create_table('tag_count',
+    sa.Column('tag_count_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('tag', sa.String(length=256), nullable=False),
+    sa.Column('post_count', sa.Integer(), nullable=False),
+    sa.Column('last_used', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('tag_count_id'),
+    sa.UniqueConstraint('user_id', 'tag', name='tag_count_user_id_tag_key')
+    )
+    op.create_index('tag_count_global_tag_key', 'tag_count', ['tag'], unique=True,
+                    postgresql_where=sa.text('user_id IS NULL'), sqlite_where=sa.text('user_id IS NULL'))
+
+    post = sa.table('post',
+                    sa.column('post_id', sa.Integer),
+                    sa.column('user_id', sa.Integer),
+                    sa.column('edited', sa.DateTime))
+    post_tag = sa.table('post_tag',
+                        sa.column('post_id', sa.Integer),
+                        sa.column('content', sa.String))
+    source = post_tag.join(post, post_tag.c.post_id == post.c.post_id)
+    op.execute(tag_count.insert().from_select(
+        ['user_id', 'tag', 'post_count', 'last_used'],
+        sa.select([post.c.user_id, post_tag.c.content, sa.func.count(), sa.func.max(post.c.edited)]).
+        select_from(source).
+        group_by(post.c.user_id, post_tag.c.content)))
+    op.execute(tag_count.insert().from_select(
+        ['user_id', 'tag', 'post_count', 'last_used'],
+        sa.select([sa.null(), post_tag.c.content, sa.func.count(), sa.func.max(post.c.edited)]).
+        select_from(source).
+        group_by(post_tag.c.content)))
+
+
+def downgrade():
+    op.drop_index('tag_count_global_tag_key', table_name='tag_count')
+    op.drop_table('tag_count')
@@ -0,0 +1,25 @@
+"""Repost delivery post url
+
+Revision ID: d06f3b8e9a21
+Revises: 4e8a1f7c6b39
+Create Date: 2026-10-18 18:31:07.492615+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd06f3b8e9a21'
+down_revision = '4e8a1f7c6b39'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('repost_delivery', sa.Column('post_url', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('repost_delivery') as batch_op:
+        batch_op.drop_column('post_url')
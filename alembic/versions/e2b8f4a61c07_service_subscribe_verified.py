@@ -0,0 +1,25 @@
+"""Service subscribe verified
+
+Revision ID: e2b8f4a61c07
+Revises: a47d0c3e9b25
+Create Date: 2026-10-18 15:48:13.526904+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b8f4a61c07'
+down_revision = 'a47d0c3e9b25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('service_subscribe', sa.Column('verified', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('service_subscribe') as batch_op:
+        batch_op.drop_column('verified')
@@ -1,18 +1,52 @@
-from os import environ
+from os import environ, path
+from tempfile import gettempdir
 
 
 class Config:
     SECRET_KEY = environ.get('WORDS_SECRET_KEY', 'development')
     SQLALCHEMY_DATABASE_URI = environ.get('WORDS_SQLALCHEMY_DATABASE_URI', '')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ENGINE_OPTIONS = dict(pool_pre_ping=True, echo=True)
+    MAX_CONTENT_LENGTH = int(environ.get('WORDS_MAX_CONTENT_LENGTH', 8 * 1024 * 1024))
+    SQLALCHEMY_ENGINE_OPTIONS = dict(pool_pre_ping=True)
+    SQL_SLOW_QUERY_THRESHOLD = float(environ.get('WORDS_SQL_SLOW_QUERY_THRESHOLD', 0.5))
+    BCRYPT_LOG_ROUNDS = int(environ.get('WORDS_BCRYPT_LOG_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(environ.get('WORDS_PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE = int(environ.get('WORDS_PASSWORD_HASH_QUEUE', 8))
     RECAPTCHA_PUBLIC_KEY = environ.get('WORDS_RECAPTCHA_PUBLIC_KEY', '')
     RECAPTCHA_PRIVATE_KEY = environ.get('WORDS_RECAPTCHA_PRIVATE_KEY', '')
     BRAND = environ.get('WORDS_BRAND', 'world')
     POST_PER_PAGE = environ.get('WORDS_POST_PER_PAGE', 3)
     LINES_FOR_ANNOTATION = environ.get('WORDS_LINES_PER_ANNOTATION', 3)
+    SEARCH_CONFIG = environ.get('WORDS_SEARCH_CONFIG', 'simple')
+    TAGS_FOR_CLOUD = int(environ.get('WORDS_TAGS_FOR_CLOUD', 50))
+    RENDER_CACHE_SIZE = int(environ.get('WORDS_RENDER_CACHE_SIZE', 1024))
+    RENDER_CACHE_TTL = int(environ.get('WORDS_RENDER_CACHE_TTL', 60 * 60))
+    PAGE_CACHE_BACKEND = environ.get('WORDS_PAGE_CACHE_BACKEND', 'null')
+    PAGE_CACHE_SIZE = int(environ.get('WORDS_PAGE_CACHE_SIZE', 512))
+    PAGE_CACHE_TTL = int(environ.get('WORDS_PAGE_CACHE_TTL', 5 * 60))
+    PAGE_CACHE_DIR = environ.get('WORDS_PAGE_CACHE_DIR', path.join(gettempdir(), 'words-page-cache'))
+    SURROGATE_PURGER = environ.get('WORDS_SURROGATE_PURGER', 'null')
+    SURROGATE_PURGE_URL = environ.get('WORDS_SURROGATE_PURGE_URL', '')
+    SURROGATE_PURGE_METHOD = environ.get('WORDS_SURROGATE_PURGE_METHOD', 'PURGE')
+    SURROGATE_PURGE_HEADER = environ.get('WORDS_SURROGATE_PURGE_HEADER', 'Surrogate-Key')
+    SURROGATE_PURGE_TIMEOUT = int(environ.get('WORDS_SURROGATE_PURGE_TIMEOUT', 5))
+    GLOBAL_SITEMAP_CACHE_TTL = int(environ.get('WORDS_GLOBAL_SITEMAP_CACHE_TTL', 10 * 60))
+    LOGOTYPE_MAX_PIXELS = int(environ.get('WORDS_LOGOTYPE_MAX_PIXELS', 4096 * 4096))
+    LOGOTYPE_MAX_AGE = int(environ.get('WORDS_LOGOTYPE_MAX_AGE', 365 * 24 * 60 * 60))
+    USER_SNAPSHOT_TTL = int(environ.get('WORDS_USER_SNAPSHOT_TTL', 60))
     TELEGRAM_BOT_TOKEN = environ.get('WORDS_TELEGRAM_BOT_TOKEN', '')
     TELEGRAM_BOT_PROXY = environ.get('WORDS_TELEGRAM_BOT_PROXY', None)
+    TELEGRAM_BOT_POOL_SIZE = int(environ.get('WORDS_TELEGRAM_BOT_POOL_SIZE', 8))
+    REPOST_COALESCE_WINDOW = int(environ.get('WORDS_REPOST_COALESCE_WINDOW', 0))
+    OUTBOX_BATCH_SIZE = int(environ.get('WORDS_OUTBOX_BATCH_SIZE', 100))
+    OUTBOX_POLL_INTERVAL = float(environ.get('WORDS_OUTBOX_POLL_INTERVAL', 1))
+    RATE_LIMIT_STORAGE = environ.get('WORDS_RATE_LIMIT_STORAGE', 'database')
+    RATE_LIMIT_MAX_WAIT = float(environ.get('WORDS_RATE_LIMIT_MAX_WAIT', 1))
+    RATE_LIMITS = {
+        'telegram': environ.get('WORDS_TELEGRAM_RATE_LIMIT', '30/s'),
+        'telegram_channel': environ.get('WORDS_TELEGRAM_CHANNEL_RATE_LIMIT', '20/m'),
+    }
+    TWITTER_VERIFY_TTL = int(environ.get('WORDS_TWITTER_VERIFY_TTL', 24 * 60 * 60))
     FLASK_ADMIN_SWATCH = 'cerulean'
     ADMIN_URL = environ.get('WORDS_ADMIN_URL', '/admin')
     CELERY = dict(
@@ -24,23 +58,36 @@ class Config:
             'words.tasks.repost.all': {
                 'queue': 'repost_all',
             },
-            'words.tasks.repost.telegram': {    # Warning! Run queue with -c=1
+            'words.tasks.repost.telegram': {
                 'queue': 'repost_telegram',
             },
             'words.tasks.repost.twitter': {
                 'queue': 'repost_twitter',
             },
+            'words.tasks.repost.twitter_verify': {
+                'queue': 'repost_twitter',
+            },
+            'words.tasks.logotype.*': {
+                'queue': 'logotype',
+            },
+        },
+        beat_schedule={
+            'twitter-verify': {
+                'task': 'words.tasks.repost.twitter_verify',
+                'schedule': TWITTER_VERIFY_TTL / 4,
+            },
         },
     )
 
 
 class DevelopmentConfig(Config):
-    pass
+    SQLALCHEMY_ENGINE_OPTIONS = dict(Config.SQLALCHEMY_ENGINE_OPTIONS, echo=True)
 
 
 class TestConfig(Config):
     TESTING = True
     WTF_CSRF_ENABLED = False
+    PAGE_CACHE_BACKEND = 'null'
 
 
 class ProductionConfig(Config):
@@ -0,0 +1,28 @@
+from os import environ
+
+environ.setdefault('WORDS_CONFIG', 'config.TestConfig')
+environ.setdefault('WORDS_SQLALCHEMY_DATABASE_URI', 'sqlite://')
+
+from words.ext import db
+from words.models import User, Post, PostTag, TagCount
+from words.utils import placeholder_logotype, TAG_EXTRACTOR
+
+
+def add_user(username):
+    user = User(username, b'password', *placeholder_logotype())
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def add_post(user, title, content):
+    """Add post like edit.new_post"""
+    tags = {_.group(1) for _ in TAG_EXTRACTOR.finditer(content)}
+    post = Post(title.lower().replace(' ', '-'), title, content, 1)
+    post.post_tags.extend(PostTag(_) for _ in tags)
+    user.posts.append(post)
+    with db.get_app().test_request_context():
+        post.render()
+    TagCount.update(user.user_id, added=tags)
+    db.session.commit()
+    return post
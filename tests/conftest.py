@@ -0,0 +1,22 @@
+import pytest
+
+from tests import add_user
+from words import create_app
+from words.ext import db
+
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['POST_PER_PAGE'] = 2
+    with app.app_context():
+        db.create_all()
+        add_user(app.config['BRAND'])
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,27 @@
+import re
+
+from tests import add_post
+from words.models import User
+
+
+NEXT_LINK = re.compile(r'class="post-next hidden" href="([^"]+)"')
+
+
+def test_fragment_pages(app, client):
+    """Infinite scroll follows next link of every fragment and get every post once"""
+    user = User.query.filter_by(username=app.config['BRAND']).one()
+    for i in range(5):
+        add_post(user, 'Post {}'.format(i), 'Content {}'.format(i))
+
+    page = client.get('/').get_data(True)
+    titles = re.findall(r'<h2>(.+?)</h2>', page)
+    url = NEXT_LINK.search(page).group(1).replace('&amp;', '&')
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        fragment = response.get_data(True)
+        assert '<html' not in fragment
+        titles.extend(re.findall(r'<h2>(.+?)</h2>', fragment))
+        next_link = NEXT_LINK.search(fragment)
+        url = next_link.group(1).replace('&amp;', '&') if next_link else None
+    assert titles == ['Post {}'.format(i) for i in reversed(range(5))]
@@ -0,0 +1,30 @@
+from io import BytesIO
+from types import SimpleNamespace
+
+from PIL import Image
+
+from tests import add_user
+from words.ext import db
+from words.models import User, Outbox, LogotypeUpload
+from words.tasks import logotype
+
+
+def test_upload_staged(app, client):
+    """Upload passed to resize task through logotype_upload, outbox and task get only user_id"""
+    user = add_user('author')
+    user_id, placeholder = user.user_id, user.logotype
+    image = BytesIO()
+    Image.new('RGB', (600, 400), 'red').save(image, 'PNG')
+    image.seek(0)
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    response = client.post('/edit/profile', data={'logotype': (image, 'logotype.png'), 'about': 'About'},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert [(_.task, _.args) for _ in Outbox.query.all()] == [('words.tasks.logotype.resize', [user_id])]
+    assert LogotypeUpload.query.filter_by(user_id=user_id).count() == 1
+
+    logotype.resize(SimpleNamespace(), user_id)
+    db.session.remove()
+    assert User.query.get(user_id).logotype != placeholder
+    assert LogotypeUpload.query.count() == 0
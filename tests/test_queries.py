@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy import event
+
+from tests import add_user, add_post
+from words.ext import db
+
+
+@pytest.fixture
+def statements(app):
+    """List of SQL statements executed while test"""
+    executed = []
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+    yield executed
+    event.remove(db.engine, 'before_cursor_execute', _before_cursor_execute)
+
+
+@pytest.mark.parametrize('url, count', (
+    # Global user, count of posts, posts, tags of posts, authors of posts, tag cloud
+    ('/', 6),
+    ('/user/author', 6),
+    # Tag cloud not shown on tag page
+    ('/user/author/tag/news', 5),
+))
+def test_list_queries(app, client, statements, url, count):
+    """Authors and tags of listed posts loaded by one query each"""
+    users = add_user('author'), add_user('reader')
+    for i in range(6):
+        add_post(users[i % 2], 'Post {}'.format(i), 'Content {} #news'.format(i))
+    statements.clear()
+    assert client.get(url).status_code == 200
+    assert len(statements) == count, statements
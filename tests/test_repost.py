@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from tests import add_user, add_post
+from words.ext import db
+from words.models import ServiceSubscribe, Service, RepostDelivery, DeliveryStatus
+from words.tasks import repost
+
+
+def task():
+    """Bound task argument of repost functions"""
+    return SimpleNamespace(request=SimpleNamespace(retries=0), max_retries=3, default_retry_delay=0)
+
+
+@pytest.fixture
+def subscription(app):
+    user = add_user('author')
+    service = ServiceSubscribe(Service.TELEGRAM.name, {'channel_name': '@channel'})
+    user.service_subscribes.append(service)
+    db.session.commit()
+    return service
+
+
+def test_legacy_telegram(app, subscription):
+    """Task queued with (service_id, post_id, post_url) before delivery ledger create its delivery and send post"""
+    post = add_post(subscription.user, 'Post', 'Content')
+    assert RepostDelivery.query.count() == 0
+    bot = mock.Mock()
+    with mock.patch.object(repost, 'telegram_bot', return_value=bot):
+        repost.telegram(task(), subscription.service_subscribe_id, post.post_id, 'http://localhost/post')
+    bot.send_message.assert_called_once_with('@channel', '*Post*\n\nhttp://localhost/post', mock.ANY)
+    delivery = RepostDelivery.query.one()
+    assert (delivery.post_id, delivery.service_subscribe_id, delivery.status) == \
+        (post.post_id, subscription.service_subscribe_id, DeliveryStatus.DELIVERED.name)
+
+
+def test_legacy_twitter(app, subscription):
+    subscription.service = Service.TWITTER.name
+    db.session.commit()
+    post = add_post(subscription.user, 'Post', 'Content')
+    client = mock.Mock()
+    with mock.patch.object(repost, 'twitter_client', return_value=client):
+        repost.twitter(task(), subscription.service_subscribe_id, post.post_id, 'http://localhost/post')
+    client.PostDirectMessage.assert_called_once_with('Post\nhttp://localhost/post')
+    assert RepostDelivery.query.one().status == DeliveryStatus.DELIVERED.name
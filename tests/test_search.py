@@ -0,0 +1,40 @@
+import re
+
+from tests import add_user, add_post
+from words.search import search
+
+
+def add_posts():
+    user = add_user('author')
+    for title, content in (('First', 'apple apple apple'),
+                           ('Second', 'apple'),
+                           ('Third', 'banana'),
+                           ('Fourth', 'apple'),
+                           ('Fifth', 'apple apple')):
+        add_post(user, title, content)
+    # Rank of word depend on count of posts without it
+    for i in range(5):
+        add_post(user, 'Other {}'.format(i), 'banana')
+    return user
+
+
+def test_search_rank(app):
+    """Posts ordered by rank, posts with same rank by post_id descending, cursor continue after last post of page"""
+    user = add_posts()
+    posts, cursor = search('apple', user.user_id, None, 2)
+    assert [_.title for _ in posts] == ['First', 'Fifth']
+    assert cursor[1] == posts[-1].post_id
+    posts, cursor = search('apple', user.user_id, cursor, 2)
+    assert [_.title for _ in posts] == ['Fourth', 'Second']
+    assert cursor is None
+
+
+def test_search_pages(app, client):
+    """Second page of search view opened by cursor from next link of first page"""
+    add_posts()
+    page = client.get('/user/author/search?q=apple').get_data(True)
+    assert re.findall(r'<h2>(.+?)</h2>', page) == ['First', 'Fifth']
+    next_url = re.search(r'class="post-next hidden" href="([^"]+)"', page).group(1).replace('&amp;', '&')
+    page = client.get(next_url).get_data(True)
+    assert re.findall(r'<h2>(.+?)</h2>', page) == ['Fourth', 'Second']
+    assert 'class="post-next hidden"' not in page
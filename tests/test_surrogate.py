@@ -0,0 +1,44 @@
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from queue import Queue
+from threading import Thread
+
+import pytest
+
+from tests import add_user, add_post
+from words.ext import purger
+
+
+@pytest.fixture
+def purges(app):
+    """Queue of (method, path, Surrogate-Key header) of requests received by purge endpoint"""
+    received = Queue()
+
+    class PurgeHandler(BaseHTTPRequestHandler):
+        def do_PURGE(self):
+            received.put((self.command, self.path, self.headers['Surrogate-Key']))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), PurgeHandler)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    app.config.update(SURROGATE_PURGER='http', SURROGATE_PURGE_URL='http://127.0.0.1:{}/purge'.format(server.server_port))
+    purger.init_app(app)
+    yield received
+    server.shutdown()
+    server.server_close()
+    app.config.update(SURROGATE_PURGER='null')
+    purger.init_app(app)
+
+
+def test_purge_on_commit(app, purges):
+    """Committed post purge keys of post, its author, its tags and global pages"""
+    user = add_user('author')
+    assert purges.get(timeout=5) == ('PURGE', '/purge', 'global profile:{0} user:{0}'.format(user.user_id))
+    post = add_post(user, 'Post', 'Content #news')
+    assert purges.get(timeout=5) == ('PURGE', '/purge', 'global post:{0} tag:{1}:news user:{1}'.
+                                     format(post.post_id, user.user_id))
+    assert purges.empty()
@@ -4,9 +4,10 @@ from flask import Flask, redirect, url_for
 from flask_wtf.csrf import CSRFError
 from flask_bootstrap import WebCDN
 
-from words.ext import db, csrf, bootstrap, app_bcrypt, moment
+from words.ext import (db, csrf, bootstrap, app_bcrypt, password_hasher, moment, render_cache, page_cache, purger,
+                       metrics)
 from words.models import UserStatus
-from words import user, edit, post, error, tasks, admin
+from words import user, edit, post, error, tasks, admin, outbox
 
 
 def create_app():
@@ -18,6 +19,7 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(environ.get('WORDS_CONFIG', 'config.DevelopmentConfig'))
     db.init_app(app)
+    metrics.init_app(app)
     tasks.init_app(app)
     csrf.init_app(app)
     bootstrap.init_app(app)
@@ -25,7 +27,11 @@ def create_app():
                                                 'simplemde-js': WebCDN('//cdn.jsdelivr.net/simplemde/latest/'),
                                                 'infinite-scroll': WebCDN('//unpkg.com/infinite-scroll@3/dist/'), })
     app_bcrypt.init_app(app)
+    password_hasher.init_app(app)
     moment.init_app(app)
+    render_cache.init_app(app)
+    page_cache.init_app(app)
+    purger.init_app(app)
     admin.init_app(app)
     app.register_blueprint(user.bp)
     app.register_blueprint(edit.bp)
@@ -36,11 +42,14 @@ def create_app():
     app.add_url_rule('/feed', 'index_feed', post.global_feed, methods=('GET', ))
     app.add_url_rule('/user/{}/feed'.format(app.config['BRAND']), 'user_brand_feed', lambda: redirect(url_for('index_feed'), 301), methods=('GET', ))
     app.add_url_rule('/sitemap.xml', 'index_sitemap', post.global_sitemap, methods=('GET', ))
+    app.add_url_rule('/search', 'index_search', post.global_search, methods=('GET', ))
+    app.cli.add_command(outbox.relay_command)
     app.register_error_handler(Exception, error.page_500)
     app.register_error_handler(500, error.page_500)
     app.register_error_handler(CSRFError, error.page_400)
     app.register_error_handler(400, error.page_400)
     app.register_error_handler(404, error.page_404)
+    app.register_error_handler(503, error.page_503)
 
     @app.before_request
     def app_before_request():
@@ -1,7 +1,10 @@
 from contextlib import suppress
+from datetime import datetime
+from base64 import b64encode
 
-from flask import g, redirect, url_for, flash, request, Markup, escape
-from flask_admin import Admin
+from flask import g, redirect, url_for, flash, request, Markup, escape, Response
+from flask_admin import Admin, BaseView, expose
+from flask_admin.actions import action
 from flask_admin.menu import MenuLink
 from flask_admin.model.form import InlineFormAdmin
 from flask_admin.contrib.sqla import ModelView
@@ -10,12 +13,16 @@ from flask_admin.contrib.sqla.filters import (DateTimeBetweenFilter, DateTimeSma
                                               EnumFilterInList, FilterLike)
 from flask_admin.form.upload import ImageUploadField, ImageUploadInput
 from wtforms.fields import PasswordField
+from sqlalchemy import inspect
 import readtime
 
-from words.ext import db, app_bcrypt
-from words.utils import resize_logotype, TAG_EXTRACTOR
-from words.models import User, UserStatus, ServiceSubscribe, Service, Post, PostTag
+from words.ext import db, password_hasher, metrics, render_cache, page_cache
+from words.cache import LRUCache
+from words.utils import open_logotype, TAG_EXTRACTOR
+from words.models import (User, UserStatus, ServiceSubscribe, Service, Post, PostTag, TagCount, RepostDelivery,
+                          DeliveryStatus, Outbox, LogotypeUpload)
 from words.forms import MarkdownField
+from words.post import global_sitemap_cache
 
 
 class AdminRequiredMixin:
@@ -51,6 +58,14 @@ class LogotypeUploadField(ImageUploadField):
     def _save_file(self, data, filename):
         pass
 
+    def process_data(self, value):
+        # Stored logotype shown in preview as data uri
+        self.data = 'data:image/jpeg;base64,{}'.format(b64encode(value).decode('utf8')) if value else value
+
+    def populate_obj(self, obj, name):
+        # Uploaded logotype processed in background, task added by UserModelView.on_model_change
+        pass
+
 
 def datetime_formatter(self, context, model, name):
     dt = getattr(model, name)
@@ -63,7 +78,7 @@ class UserModelView(AdminRequiredMixin, ModelView):
     column_searchable_list = ('username', 'first_name', 'last_name', )
     column_sortable_list = ('username', 'status', 'registered', 'edited', 'first_name', 'last_name', )
     form_choices = {'status': [(_.name, _.name) for _ in UserStatus], }
-    form_excluded_columns = ('password', 'posts', 'about_time', )
+    form_excluded_columns = ('password', 'posts', 'about_time', 'logotype_small', )
     form_extra_fields = {'new_password': PasswordField('Password'), }
     form_overrides = {'logotype': LogotypeUploadField,
                       'about': MarkdownField, }
@@ -72,15 +87,30 @@ class UserModelView(AdminRequiredMixin, ModelView):
     def on_model_change(self, form, model, is_created):
         with suppress(AttributeError):
             if form.new_password.data:
-                model.password = app_bcrypt.generate_password_hash(form.new_password.data)
+                model.password = password_hasher.generate_password_hash(form.new_password.data)
             if form.logotype.data.stream:
                 form.logotype.data.stream.seek(0)
-                model.logotype = resize_logotype(form.logotype.data.stream)
+                open_logotype(form.logotype.data.stream)
+                form.logotype.data.stream.seek(0)
+                db.session.add(LogotypeUpload(model.user_id, form.logotype.data.stream.read()))
+                Outbox.add('words.tasks.logotype.resize', model.user_id)
             if form.about.data:
                 model.about_time = readtime.of_markdown(form.about.data).minutes
+        if not is_created and inspect(model).attrs.username.history.has_changes():
+            for post in model.posts:
+                post.render()
+
+    def on_model_delete(self, model):
+        # User counters removed by cascade, but global counters should be decreased
+        TagCount.update(None, removed=[_[0]
+                                       for _ in db.session.query(PostTag.content).
+                                           join(PostTag.post).
+                                           filter(Post.user_id == model.user_id).
+                                           all()])
 
     class ServiceSubscribeModelForm(InlineFormAdmin):
         can_create = False
+        form_excluded_columns = ('verified', )
         form_choices = {'service': [(_.name, _.name) for _ in Service], }
 
     inline_models = (ServiceSubscribeModelForm(ServiceSubscribe), )
@@ -101,7 +131,7 @@ class UserModelView(AdminRequiredMixin, ModelView):
         # `model` is model instance
         # `name` is property name
         return Markup('<img src="{}" width="20px" height="20px" class="img-circle"> {}'.
-                      format(escape(getattr(model, 'logotype')), escape(getattr(model, name))))
+                      format(escape(model.logotype_url(True)), escape(getattr(model, name))))
 
     column_formatters = {'username': _username_formatter,
                          'registered': datetime_formatter,
@@ -114,7 +144,8 @@ class PostModelView(AdminRequiredMixin, ModelView):
     form_ajax_refs = {
         'user': QueryAjaxModelLoader('user', db.session, User, fields=['username'], page_size=10)
     }
-    form_excluded_columns = ('content_time', 'post_tags', )
+    form_excluded_columns = ('content_time', 'post_tags', 'content_rendered', 'annotation_rendered', 'annotation_plain',
+                             'search_vector', )
 
     column_list = ('user.username',  'title', 'url', 'created', 'edited')
     column_labels = {'user.username': 'Username',
@@ -133,13 +164,33 @@ class PostModelView(AdminRequiredMixin, ModelView):
     form_overrides = {'content': MarkdownField, }
     extra_css = ('//cdn.jsdelivr.net/simplemde/latest/simplemde.min.css', )
 
+    def get_query(self):
+        return super().get_query().options(db.selectinload(Post.user))
+
+    def update_model(self, form, model):
+        # Owner before change saved before form populates model, user_id is changed by relationship only on flush
+        form.old_user_id = model.user_id
+        return super().update_model(form, model)
+
     def on_model_change(self, form, model, is_created):
+        old_user_id = getattr(form, 'old_user_id', model.user_id)
+        old_tags = [_.content for _ in model.post_tags]
         with suppress(AttributeError):
             if form.content.data:
                 tags = {_.group(1) for _ in TAG_EXTRACTOR.finditer(form.content.data)}
                 model.content_time = readtime.of_markdown(form.content.data).minutes
                 model.post_tags.clear()
                 model.post_tags.extend((PostTag(_) for _ in tags))
+        new_tags = [_.content for _ in model.post_tags]
+        if old_user_id == model.user.user_id:
+            TagCount.update(model.user.user_id, added=new_tags, removed=old_tags)
+        else:
+            TagCount.update(old_user_id, removed=old_tags)
+            TagCount.update(model.user.user_id, added=new_tags)
+        model.render()
+
+    def on_model_delete(self, model):
+        TagCount.update(model.user_id, removed=[_.content for _ in model.post_tags])
 
     def _username_formatter(view, context, model, name):
         # `view` is current administrative view
@@ -148,7 +199,7 @@ class PostModelView(AdminRequiredMixin, ModelView):
         # `name` is property name
         user = getattr(model, 'user')
         return Markup('<img src="{}" width="20px" height="20px" class="img-circle"> {}'.
-                      format(escape(getattr(user, 'logotype')), escape(getattr(user, 'username'))))
+                      format(escape(user.logotype_url(True)), escape(getattr(user, 'username'))))
 
     def _url_formatter(self, context, model, name):
         user = getattr(model, 'user')
@@ -162,10 +213,87 @@ class PostModelView(AdminRequiredMixin, ModelView):
                          'edited': datetime_formatter, }
 
 
+class RepostDeliveryModelView(AdminRequiredMixin, ModelView):
+    can_create = False
+    can_edit = False
+
+    column_list = ('post.user.username', 'post.title', 'service_subscribe.service', 'status', 'attempts', 'last_error',
+                   'updated', )
+    column_labels = {'post.user.username': 'Username',
+                     'post.title': 'Title',
+                     'service_subscribe.service': 'Service'}
+    column_sortable_list = ('status', 'attempts', 'updated', )
+    column_filters = (EnumFilterInList(RepostDelivery.status, 'Status', [(_.name, _.name) for _ in DeliveryStatus]),
+                      DateTimeBetweenFilter(RepostDelivery.updated, 'Updated'),
+                      DateTimeSmallerFilter(RepostDelivery.updated, 'Updated'),
+                      DateTimeGreaterFilter(RepostDelivery.updated, 'Updated'), )
+    column_default_sort = ('updated', True)
+
+    def get_query(self):
+        return super().get_query().options(db.selectinload(RepostDelivery.post).selectinload(Post.user),
+                                           db.selectinload(RepostDelivery.service_subscribe))
+
+    @action('retry', 'Retry', 'Are you sure you want to retry selected deliveries?')
+    def action_retry(self, ids):
+        deliveries = RepostDelivery.query.\
+            filter(RepostDelivery.repost_delivery_id.in_(ids),
+                   RepostDelivery.status != DeliveryStatus.DELIVERED.name).\
+            options(db.selectinload(RepostDelivery.post).selectinload(Post.user),
+                    db.selectinload(RepostDelivery.service_subscribe)).\
+            all()
+        # Deliveries to disabled service would stay pending, tasks not send to not alive service
+        skipped = [_ for _ in deliveries if not _.service_subscribe.alive]
+        deliveries = [_ for _ in deliveries if _.service_subscribe.alive]
+        # Only selected deliveries sent by one task per service, other deliveries of post not touched
+        payloads = {}
+        now = datetime.utcnow()
+        for delivery in deliveries:
+            delivery.status = DeliveryStatus.PENDING.name
+            delivery.attempts = 0
+            delivery.updated = now
+            post_url = delivery.post_url or url_for('post.post', username=delivery.post.user.username,
+                                                    postname=delivery.post.url, _external=True)
+            payloads.setdefault(delivery.service_subscribe, []).\
+                append([delivery.repost_delivery_id, delivery.post.title, post_url])
+        for service, payload in payloads.items():
+            if service.service == Service.TELEGRAM.name:
+                Outbox.add('words.tasks.repost.telegram', service.service_subscribe_id,
+                           service.credentials['channel_name'], payload)
+            elif service.service == Service.TWITTER.name:
+                Outbox.add('words.tasks.repost.twitter', service.service_subscribe_id, payload)
+        db.session.commit()
+        flash('{} deliveries will be retried'.format(len(deliveries)), 'success')
+        if skipped:
+            flash('{} deliveries not retried, their services are disabled'.format(len(skipped)), 'warning')
+
+    @action('delivered', 'Mark delivered', 'Are you sure you want to mark selected deliveries as delivered?')
+    def action_delivered(self, ids):
+        count = RepostDelivery.query.\
+            filter(RepostDelivery.repost_delivery_id.in_(ids)).\
+            update({RepostDelivery.status: DeliveryStatus.DELIVERED.name, RepostDelivery.updated: datetime.utcnow()},
+                   synchronize_session=False)
+        db.session.commit()
+        flash('{} deliveries marked as delivered'.format(count), 'success')
+
+    column_formatters = {'updated': datetime_formatter, }
+
+
+class MetricsView(AdminRequiredMixin, BaseView):
+    @expose('/')
+    def index(self):
+        caches = {'render': render_cache, 'global_sitemap': global_sitemap_cache}
+        if isinstance(page_cache.backend, LRUCache):
+            caches['page'] = page_cache.backend
+        return Response(metrics.render(caches), content_type='text/plain; version=0.0.4')
+
+
 def init_app(app):
     """Init admin panel"""
     root_url = app.config['ADMIN_URL']
     admin = Admin(app, name='Words', template_mode='bootstrap3',
                   index_view=UserModelView(User, db.session, endpoint='admin', url=root_url, static_folder='static'))
     admin.add_view(PostModelView(Post, db.session, endpoint='admin.post', url='{}/post'.format(root_url)))
+    admin.add_view(RepostDeliveryModelView(RepostDelivery, db.session, name='Deliveries', endpoint='admin.delivery',
+                                           url='{}/delivery'.format(root_url)))
+    admin.add_view(MetricsView(name='Metrics', endpoint='admin.metrics', url='{}/metrics'.format(root_url)))
     admin.add_link(MenuLink('Home', endpoint='index'))
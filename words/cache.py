@@ -0,0 +1,235 @@
+from collections import OrderedDict
+from functools import wraps
+from hashlib import sha1
+from itertools import count
+from os import makedirs, listdir, remove, replace, path
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from time import monotonic, time
+from uuid import uuid4
+import pickle
+
+from flask import Response, make_response, request, session, g
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with optional TTL
+
+    Counters `hits`, `misses` and `evictions` (expired entries included) are available for monitoring.
+    """
+    def __init__(self, maxsize=1024, ttl=None):
+        """
+        :param maxsize: Maximal count of entries
+        :param ttl: Time to live of entry in seconds (None - without expiration)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        """Get value by key
+
+        :param key: Key of entry
+        :param default: Returned if entry not exists or expired
+        """
+        with self._lock:
+            try:
+                expire, value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expire is not None and expire < monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Set value by key, least recently used entries are evicted when cache is full"""
+        with self._lock:
+            self._entries[key] = (monotonic() + self.ttl if self.ttl else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """Delete entry by key if exists"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Delete all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_set(self, key, factory):
+        """Get value by key or calculate it by factory() and store
+
+        :param key: Key of entry
+        :param factory: Callable without arguments for calculate value
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def stats(self):
+        """Counters of cache"""
+        with self._lock:
+            return dict(size=len(self._entries), hits=self.hits, misses=self.misses, evictions=self.evictions)
+
+
+class RenderCache(LRUCache):
+    """Cache of rendered markdown keyed by hash of source text"""
+    def init_app(self, app):
+        self.maxsize = app.config['RENDER_CACHE_SIZE']
+        self.ttl = app.config['RENDER_CACHE_TTL']
+        self.clear()
+
+    def render(self, kind, source, renderer, *flags):
+        """Get rendered source from cache or render it
+
+        :param kind: Kind of rendering (part of key)
+        :param source: Source text
+        :param renderer: Callable without arguments for rendering source
+        :param flags: Additional values which affect rendering (part of key)
+        """
+        return self.get_or_set((kind, sha1(source.encode('utf8')).hexdigest()) + flags, renderer)
+
+
+class FileSystemCache:
+    """Cache in files of directory (shared by processes of host) with optional TTL
+
+    Expired files removed when read and by periodic pruning while set.
+    """
+    PRUNE_EVERY = 100
+
+    def __init__(self, directory, ttl=None):
+        """
+        :param directory: Directory of cache files (created if not exists)
+        :param ttl: Time to live of entry in seconds (None - without expiration)
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self._sets = count()
+        makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return path.join(self.directory, sha1(repr(key).encode('utf8')).hexdigest())
+
+    def _load(self, filename):
+        """Load (expire, value) of file, None if file not exists or expired (expired file removed)"""
+        try:
+            with open(filename, 'rb') as fp:
+                expire, value = pickle.load(fp)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expire is not None and expire < time():
+            self._remove(filename)
+            return None
+        return expire, value
+
+    @staticmethod
+    def _remove(filename):
+        try:
+            remove(filename)
+        except OSError:
+            pass
+
+    def get(self, key, default=None):
+        entry = self._load(self._path(key))
+        return default if entry is None else entry[1]
+
+    def set(self, key, value):
+        # Written to temporary file and renamed, so other processes not read partially written file
+        with NamedTemporaryFile('wb', dir=self.directory, prefix='.', delete=False) as fp:
+            pickle.dump((time() + self.ttl if self.ttl else None, value), fp, pickle.HIGHEST_PROTOCOL)
+        replace(fp.name, self._path(key))
+        if next(self._sets) % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def delete(self, key):
+        self._remove(self._path(key))
+
+    def prune(self):
+        """Remove expired files"""
+        for filename in listdir(self.directory):
+            if not filename.startswith('.'):
+                self._load(path.join(self.directory, filename))
+
+    def clear(self):
+        for filename in listdir(self.directory):
+            self._remove(path.join(self.directory, filename))
+
+
+class PageCache:
+    """Cache of full pages for anonymous users
+
+    Backend (PAGE_CACHE_BACKEND) is LRUCache in memory of process ('memory', invalidated only in process which
+    committed changes, so only for single web worker), FileSystemCache shared by processes of host ('filesystem') or
+    cache is disabled ('null', default). Pages cached in namespaces, every namespace has generation which is part of
+    key, so invalidation of namespace is replace of generation.
+    """
+    def __init__(self):
+        self.backend = None
+
+    def init_app(self, app):
+        backend = app.config['PAGE_CACHE_BACKEND']
+        if backend == 'memory':
+            self.backend = LRUCache(app.config['PAGE_CACHE_SIZE'], app.config['PAGE_CACHE_TTL'])
+        elif backend == 'filesystem':
+            self.backend = FileSystemCache(app.config['PAGE_CACHE_DIR'], app.config['PAGE_CACHE_TTL'])
+        else:
+            self.backend = None
+
+    def generation(self, namespace):
+        """Current generation of namespace (created if not exists)"""
+        key = ('generation', namespace)
+        generation = self.backend.get(key)
+        if generation is None:
+            generation = uuid4().hex
+            self.backend.set(key, generation)
+        return generation
+
+    def invalidate(self, *namespaces):
+        """Invalidate all pages of namespaces"""
+        if self.backend is not None:
+            for namespace in namespaces:
+                self.backend.set(('generation', namespace), uuid4().hex)
+
+    def cached(self, namespace, vary=()):
+        """Decorate view for cache page of anonymous user (also it is not cached if session has flashed messages)
+
+        Pages of every namespace also invalidated by namespace 'all'.
+
+        :param namespace: Callable without arguments, return namespace of page
+        :param vary: Names of request headers which change page (part of key)
+        """
+        def _cached(view):
+            @wraps(view)
+            def _cached_wraps(*args, **kwargs):
+                if self.backend is None or request.method != 'GET' or g.user or \
+                        'user_id' in session or '_flashes' in session:
+                    return view(*args, **kwargs)
+                key = ('page', self.generation('all'), self.generation(namespace()), request.url) + \
+                    tuple(request.headers.get(_) for _ in vary)
+                page = self.backend.get(key)
+                if page is not None:
+                    data, headers = page
+                    return Response(data, headers=headers)
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    self.backend.set(key, (response.get_data(), list(response.headers)))
+                return response
+            return _cached_wraps
+        return _cached
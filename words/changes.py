@@ -0,0 +1,55 @@
+from collections import namedtuple
+from itertools import chain
+import logging
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+
+logger = logging.getLogger(__name__)
+
+Change = namedtuple('Change', ('model', 'user_id', 'post_id', 'tag'))
+"""Changed model instance: model class name, user_id, post_id and tag (PostTag content) of instance (None if model not
+have it)"""
+
+_listeners = []
+
+
+def on_commit(listener):
+    """Register listener for committed changes (can be used as decorator)
+
+    :param listener: Callable with one argument - set of Change, called after every commit which changed models
+    """
+    _listeners.append(listener)
+    return listener
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    changes = session.info.setdefault('words_changes', set())
+    # Instance changed only by collection (post appended to User.posts) not changed itself
+    dirty = (_ for _ in session.dirty if session.is_modified(_, include_collections=False))
+    for instance in chain(session.new, dirty, session.deleted):
+        # Read loaded state only, expired attributes of deleted instances can not be loaded
+        state = inspect(instance).dict
+        model = type(instance).__name__
+        changes.add(Change(model, state.get('user_id'), state.get('post_id'),
+                           state.get('content') if model == 'PostTag' else None))
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify_changes(session):
+    changes = session.info.pop('words_changes', None)
+    if not changes:
+        return
+    for listener in _listeners:
+        try:
+            listener(changes)
+        except Exception:
+            # Data already committed, listener error should not fail request
+            logger.exception('on_commit listener %r', listener)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('words_changes', None)
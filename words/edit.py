@@ -5,11 +5,11 @@ from sqlalchemy.exc import IntegrityError
 import readtime
 from transliterate import translit, detect_language
 
-from words.models import UserStatus, Post, PostTag
+from words.models import UserStatus, Post, PostTag, TagCount, Outbox, LogotypeUpload
 from words.user import only_for
 from words.forms import ProfileForm, PostForm
-from words.ext import db, celery
-from words.utils import resize_logotype, TAG_EXTRACTOR
+from words.ext import db
+from words.utils import open_logotype, TAG_EXTRACTOR
 
 
 bp = Blueprint('edit', __name__, url_prefix='/edit')
@@ -27,9 +27,13 @@ def profile():
         g.user.about_time = readtime.of_markdown(form.about.data).minutes
         if form.logotype.data:
             try:
-                g.user.logotype = resize_logotype(form.logotype.data.stream)
+                open_logotype(form.logotype.data.stream)
+                form.logotype.data.stream.seek(0)
+                # Current logotype kept until new logotype processed
+                db.session.add(LogotypeUpload(g.user.user_id, form.logotype.data.stream.read()))
+                Outbox.add('words.tasks.logotype.resize', g.user.user_id)
             except ValueError:
-                flash('Avatar should be JPG or PNG file format', 'warning')
+                flash('Avatar should be JPG, PNG or WEBP file format', 'warning')
         db.session.commit()
     return render_template('edit/profile.html', form=form)
 
@@ -53,10 +57,14 @@ def new_post():
         post = Post(url, title, content, readtime.of_markdown(content).minutes)
         post.post_tags.extend(PostTag(_) for _ in tags)
         g.user.posts.append(post)
+        post.render()
         try:
-            db.session.commit()
+            TagCount.update(g.user.user_id, added=tags)
+            db.session.flush()
             post_url = url_for('post.post', username=g.user.username, postname=url, _external=True)
-            celery.send_task('words.tasks.repost.all', (post.post_id, post_url))
+            # Sent to broker by outbox relay, so post and repost committed together
+            Outbox.add('words.tasks.repost.all', post.post_id, post_url)
+            db.session.commit()
             return redirect(post_url)
         except IntegrityError:
             flash('This title already exists. Please, enter another title.', 'warning')
@@ -84,9 +92,12 @@ def edit_post(postname):
         post.title = title
         post.content = content
         post.content_time = readtime.of_markdown(content).minutes
+        post.render()
+        old_tags = {_.content for _ in post.post_tags}
         post.post_tags.clear()
         post.post_tags.extend(PostTag(_) for _ in tags)
         try:
+            TagCount.update(post.user_id, added=tags - old_tags, removed=old_tags - tags)
             db.session.commit()
             return redirect(url_for('post.post', username=g.user.username, postname=url))
         except IntegrityError:
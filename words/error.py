@@ -17,3 +17,8 @@ def page_400(_):
 def page_404(_):
     """Page 404"""
     return render_template('error/404.html'), 404
+
+
+def page_503(_):
+    """Page 503"""
+    return render_template('error/503.html'), 503
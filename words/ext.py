@@ -5,10 +5,20 @@ from flask_bcrypt import Bcrypt
 from flask_moment import Moment
 from celery import Celery
 
+from words.cache import RenderCache, PageCache
+from words.password import PasswordHasher
+from words.surrogate import Purger
+from words.metrics import Metrics
+
 
 db = SQLAlchemy()
 csrf = CSRFProtect()
 bootstrap = Bootstrap()
 app_bcrypt = Bcrypt()
+password_hasher = PasswordHasher(app_bcrypt)
 moment = Moment()
 celery = Celery(__name__.split('.', 1)[0])
+render_cache = RenderCache()
+page_cache = PageCache()
+purger = Purger()
+metrics = Metrics()
@@ -0,0 +1,137 @@
+from collections import defaultdict
+from threading import Lock
+from time import perf_counter
+import logging
+
+from flask import g, request, has_app_context, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+logger = logging.getLogger(__name__)
+
+# Name: (type, help), labeled by endpoint (request_*) or task name (task_*)
+METRICS = {
+    'words_requests_total': ('counter', 'Count of requests'),
+    'words_request_sql_queries_total': ('counter', 'Count of SQL statements executed by requests'),
+    'words_request_sql_seconds_total': ('counter', 'Time of SQL statements executed by requests'),
+    'words_request_sql_slowest_seconds': ('gauge', 'Slowest SQL statement of request'),
+    'words_tasks_total': ('counter', 'Count of celery tasks'),
+    'words_task_sql_queries_total': ('counter', 'Count of SQL statements executed by tasks'),
+    'words_task_sql_seconds_total': ('counter', 'Time of SQL statements executed by tasks'),
+    'words_task_sql_slowest_seconds': ('gauge', 'Slowest SQL statement of task'),
+}
+CACHE_METRICS = {
+    'size': ('gauge', 'Count of cache entries'),
+    'hits': ('counter', 'Count of cache hits'),
+    'misses': ('counter', 'Count of cache misses'),
+    'evictions': ('counter', 'Count of evicted cache entries'),
+}
+
+
+class QueryStats:
+    """SQL statements of one request or task"""
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0
+        self.slowest = 0
+        self.slowest_statement = None
+
+    def add(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        if seconds > self.slowest:
+            self.slowest = seconds
+            self.slowest_statement = statement
+
+
+class Metrics:
+    """SQL metrics of requests and celery tasks of process
+
+    Time of every SQL statement measured by engine events and collected in g.sql_stats, so stats of current request or
+    task available while it processed. Statements slower than SQL_SLOW_QUERY_THRESHOLD seconds are logged.
+    """
+    def __init__(self):
+        self.slow_query_threshold = None
+        self.slow_queries = 0
+        self._values = defaultdict(dict)
+        self._lock = Lock()
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def init_app(self, app):
+        self.slow_query_threshold = app.config['SQL_SLOW_QUERY_THRESHOLD']
+
+        @app.teardown_request
+        def _record_request(exc):
+            self.record('request', request.endpoint or 'unknown')
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('words_query_start', []).append(perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        seconds = perf_counter() - conn.info['words_query_start'].pop()
+        if self.slow_query_threshold and seconds >= self.slow_query_threshold:
+            with self._lock:
+                self.slow_queries += 1
+            logger.warning('slow query of %s %.3fs: %s', _current_name(), seconds, statement)
+        if has_app_context():
+            if 'sql_stats' not in g:
+                g.sql_stats = QueryStats()
+            g.sql_stats.add(statement, seconds)
+
+    def record(self, kind, name):
+        """Add stats of current request or task (g.sql_stats) to metrics of process
+
+        :param kind: 'request' or 'task'
+        :param name: Endpoint or name of task
+        """
+        stats = g.pop('sql_stats', None) or QueryStats()
+        if self.slow_query_threshold and stats.slowest >= self.slow_query_threshold:
+            logger.warning('%s %s: %d queries %.3fs, slowest %.3fs: %s',
+                           kind, name, stats.count, stats.seconds, stats.slowest, stats.slowest_statement)
+        with self._lock:
+            for metric, value in (('words_{}s_total', 1),
+                                  ('words_{}_sql_queries_total', stats.count),
+                                  ('words_{}_sql_seconds_total', stats.seconds)):
+                values = self._values[metric.format(kind)]
+                values[name] = values.get(name, 0) + value
+            values = self._values['words_{}_sql_slowest_seconds'.format(kind)]
+            values[name] = max(values.get(name, 0), stats.slowest)
+
+    def render(self, caches):
+        """Metrics in Prometheus text format
+
+        :param caches: Dict name: cache with stats() (LRUCache)
+        """
+        lines = []
+        with self._lock:
+            for metric, (metric_type, metric_help) in METRICS.items():
+                label = 'task' if metric.startswith('words_task') else 'endpoint'
+                lines.extend(('# HELP {} {}'.format(metric, metric_help), '# TYPE {} {}'.format(metric, metric_type)))
+                lines.extend('{}{{{}="{}"}} {}'.format(metric, label, _escape(name), value)
+                             for name, value in sorted(self._values[metric].items()))
+            lines.extend(('# HELP words_sql_slow_queries_total Count of SQL statements slower than threshold',
+                          '# TYPE words_sql_slow_queries_total counter',
+                          'words_sql_slow_queries_total {}'.format(self.slow_queries)))
+        stats = {name: cache.stats() for name, cache in caches.items()}
+        for key, (metric_type, metric_help) in CACHE_METRICS.items():
+            metric = 'words_cache_{}'.format(key) if metric_type == 'gauge' else 'words_cache_{}_total'.format(key)
+            lines.extend(('# HELP {} {}'.format(metric, metric_help), '# TYPE {} {}'.format(metric, metric_type)))
+            lines.extend('{}{{cache="{}"}} {}'.format(metric, _escape(name), values[key])
+                         for name, values in sorted(stats.items()))
+        return '\n'.join(lines) + '\n'
+
+
+def _current_name():
+    """Endpoint of current request or name of current task (set by ContextTask)"""
+    if has_request_context():
+        return 'request {}'.format(request.endpoint or 'unknown')
+    if has_app_context() and 'task_name' in g:
+        return 'task {}'.format(g.task_name)
+    return 'unknown'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
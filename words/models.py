@@ -1,10 +1,13 @@
 import enum
 from datetime import datetime
+from collections import Counter
 
 import markdown2
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.exc import IntegrityError
 from flask import Markup, current_app, url_for
 
-from words.ext import db
+from words.ext import db, render_cache
 from words.utils import TAG_EXTRACTOR, html2plain
 
 
@@ -19,6 +22,12 @@ class Service(enum.Enum):
     TWITTER = 2
 
 
+class DeliveryStatus(enum.Enum):
+    PENDING = 1
+    DELIVERED = 2
+    FAILED = 3
+
+
 class User(db.Model):
     __tablename__ = 'user'
 
@@ -28,7 +37,8 @@ class User(db.Model):
     status = db.Column(db.String(32), nullable=False, default=UserStatus.NORMAL.name)
     registered = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     edited = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    logotype = db.Column(db.Text, nullable=False)
+    logotype = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    logotype_small = db.deferred(db.Column(db.LargeBinary, nullable=False))
     first_name = db.Column(db.String(32), nullable=False, default='')
     last_name = db.Column(db.String(32), nullable=False, default='')
     about = db.Column(db.Text, nullable=False, default='')
@@ -36,16 +46,25 @@ class User(db.Model):
     service_subscribes = db.relationship('ServiceSubscribe', back_populates='user', cascade='all, delete-orphan', passive_deletes=True)
     posts = db.relationship('Post', back_populates='user', cascade='all, delete-orphan', passive_deletes=True)
 
-    def __init__(self, username, password, logotype):
+    def __init__(self, username, password, logotype, logotype_small):
         self.username = username
         self.password = password
         self.logotype = logotype
+        self.logotype_small = logotype_small
+
+    def logotype_url(self, small=False):
+        """Url of logotype (versioned by edited time, so it can be cached forever)
+
+        :param small: Url of small logotype (for lists)
+        """
+        return url_for('post.logotype_small' if small else 'post.logotype',
+                       username=self.username, v=self.edited.strftime('%Y%m%d%H%M%S%f'))
 
     def about_html(self):
-        return Markup(markdown2.markdown(self.about))
+        return Markup(render_cache.render('about_html', self.about, lambda: markdown2.markdown(self.about)))
 
     def about_plain(self):
-        return html2plain(str(self.about_html()))
+        return render_cache.render('about_plain', self.about, lambda: html2plain(str(self.about_html())))
 
     def __str__(self):
         return self.username
@@ -60,6 +79,7 @@ class ServiceSubscribe(db.Model):
     service = db.Column(db.String(32), nullable=False)
     credentials = db.Column(db.JSON, nullable=False)
     alive = db.Column(db.Boolean, nullable=False, default=True)
+    verified = db.Column(db.DateTime, nullable=True)
 
     def __init__(self, service=None, credentials=None):
         self.service = service
@@ -70,6 +90,8 @@ class Post(db.Model):
     __tablename__ = 'post'
     __table_args__ = (
         db.UniqueConstraint('user_id', 'title', name='post_user_id_title_key'),
+        db.Index('post_user_id_edited_idx', 'user_id', 'edited'),
+        db.Index('post_edited_idx', 'edited'),
     )
 
     post_id = db.Column(db.Integer, primary_key=True)
@@ -81,6 +103,10 @@ class Post(db.Model):
     title = db.Column(db.String(256), nullable=False)
     content = db.Column(db.Text, nullable=False)
     content_time = db.Column(db.Integer, nullable=False, default=0)
+    content_rendered = db.Column(db.Text, nullable=False, default='')
+    annotation_rendered = db.Column(db.Text, nullable=False, default='')
+    annotation_plain = db.Column(db.Text, nullable=False, default='')
+    search_vector = db.deferred(db.Column(db.Text().with_variant(TSVECTOR(), 'postgresql'), nullable=True))
     post_tags = db.relationship('PostTag', back_populates='post', cascade='all, delete-orphan', passive_deletes=True)
 
     def __init__(self, url, title, content, content_time):
@@ -89,19 +115,34 @@ class Post(db.Model):
         self.content = content
         self.content_time = content_time
 
-    def content_html(self, full=False):
+    @staticmethod
+    def render_content(username, content):
+        """Render markdown content of post
+
+        :param username: Username of post owner (used for tag urls)
+        :param content: Markdown content
+        :return: (full html, annotation html, annotation plain text)
+        """
         tag_url = r'''[#\g<1>]({})\g<2>'''.\
-            format(url_for('post.posts_by_tag', username=self.user.username, tagname='tagname').
+            format(url_for('post.posts_by_tag', username=username, tagname='tagname').
                    replace('tagname', '\\g<1>'))
-        return Markup(
-            markdown2.markdown(
-                TAG_EXTRACTOR.sub(tag_url,
-                                  self.content if full
-                                  else '\n'.join(self.content.split('\n')[:current_app.config['LINES_FOR_ANNOTATION']])
-                                  )))
+        annotation = '\n'.join(content.split('\n')[:current_app.config['LINES_FOR_ANNOTATION']])
+        content_rendered = markdown2.markdown(TAG_EXTRACTOR.sub(tag_url, content))
+        annotation_rendered = markdown2.markdown(TAG_EXTRACTOR.sub(tag_url, annotation))
+        return content_rendered, annotation_rendered, html2plain(annotation_rendered)
+
+    def render(self):
+        """Store rendered content, must be called after every change of content or owner username"""
+        self.content_rendered, self.annotation_rendered, self.annotation_plain = \
+            self.render_content(self.user.username, self.content)
+
+    def content_html(self, full=False):
+        return Markup(self.content_rendered if full else self.annotation_rendered)
 
     def content_plain(self, full=False):
-        return html2plain(str(self.content_html(full)))
+        if not full:
+            return self.annotation_plain
+        return render_cache.render('content_plain', self.content_rendered, lambda: html2plain(self.content_rendered))
 
 
 class PostTag(db.Model):
@@ -114,3 +155,243 @@ class PostTag(db.Model):
 
     def __init__(self, content):
         self.content = content
+
+
+class TagCount(db.Model):
+    """Count of posts by tag for user (user_id is None for global counters)"""
+    __tablename__ = 'tag_count'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'tag', name='tag_count_user_id_tag_key'),
+        db.Index('tag_count_global_tag_key', 'tag', unique=True,
+                 postgresql_where=db.text('user_id IS NULL'), sqlite_where=db.text('user_id IS NULL')),
+    )
+
+    tag_count_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.user_id', ondelete='CASCADE'), nullable=True)
+    tag = db.Column(db.String(256), nullable=False)
+    post_count = db.Column(db.Integer, nullable=False, default=0)
+    last_used = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __init__(self, user_id, tag, post_count, last_used):
+        self.user_id = user_id
+        self.tag = tag
+        self.post_count = post_count
+        self.last_used = last_used
+
+    @classmethod
+    def update(cls, user_id, added=(), removed=()):
+        """Update tag counters of user and global tag counters
+
+        :param user_id: Posts owner (if None update only global counters)
+        :param added: Tags added to posts (tag can be repeated for several posts)
+        :param removed: Tags removed from posts (tag can be repeated for several posts)
+        """
+        changes = Counter(added)
+        changes.subtract(removed)
+        now = datetime.utcnow()
+        # Errors of pending objects (post with same url) raised here, not taken as error of counter
+        db.session.flush()
+        for owner_id in {user_id, None}:
+            for tag, change in changes.items():
+                if change > 0:
+                    if not cls._increment(owner_id, tag, change, now):
+                        try:
+                            with db.session.begin_nested():
+                                db.session.add(cls(owner_id, tag, change, now))
+                        except IntegrityError:
+                            # Counter created by concurrent transaction after update
+                            cls._increment(owner_id, tag, change, now)
+                elif change < 0:
+                    cls.query.\
+                        filter_by(user_id=owner_id, tag=tag).\
+                        update({cls.post_count: cls.post_count + change}, synchronize_session=False)
+            if any(_ < 0 for _ in changes.values()):
+                cls.query.filter(cls.user_id == owner_id, cls.post_count <= 0).delete(synchronize_session=False)
+
+    @classmethod
+    def _increment(cls, user_id, tag, change, now):
+        """:return: False if counter not exists"""
+        return bool(cls.query.
+                    filter_by(user_id=user_id, tag=tag).
+                    update({cls.post_count: cls.post_count + change, cls.last_used: now},
+                           synchronize_session=False))
+
+    @classmethod
+    def top(cls, user_id, limit):
+        """Most used tags of user (global if user_id is None)
+
+        :param user_id: Posts owner
+        :param limit: Maximal count of tags
+        """
+        return [_[0]
+                for _ in db.session.query(cls.tag).
+                    filter(cls.user_id == user_id).
+                    order_by(cls.post_count.desc(), cls.tag).
+                    limit(limit).
+                    all()]
+
+
+class RateLimitBucket(db.Model):
+    """Token bucket of rate limiter shared by all worker processes"""
+    __tablename__ = 'rate_limit_bucket'
+
+    name = db.Column(db.String(256), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated = db.Column(db.Float, nullable=False)
+
+
+class Outbox(db.Model):
+    """Celery task written in transaction of changes and sent to broker by relay (words.outbox)"""
+    __tablename__ = 'outbox'
+
+    outbox_id = db.Column(db.Integer, primary_key=True)
+    task = db.Column(db.String(256), nullable=False)
+    args = db.Column(db.JSON, nullable=False)
+    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __init__(self, task, args):
+        self.task = task
+        self.args = args
+
+    @classmethod
+    def add(cls, task, *args):
+        """Add task to outbox of current transaction
+
+        :param task: Name of celery task
+        :param args: Arguments of task (should be JSON serializable)
+        """
+        db.session.add(cls(task, list(args)))
+
+
+class LogotypeUpload(db.Model):
+    """Uploaded logotype staged until resized by task, so upload not passed through outbox and broker"""
+    __tablename__ = 'logotype_upload'
+    __table_args__ = (
+        db.Index('logotype_upload_user_id_idx', 'user_id'),
+    )
+
+    logotype_upload_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.user_id', ondelete='CASCADE'), nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __init__(self, user_id, data):
+        self.user_id = user_id
+        self.data = data
+
+    @classmethod
+    def take(cls, user_id):
+        """Last upload of user, all uploads of user removed in current transaction
+
+        :return: Uploaded data or None if uploads of user already taken
+        """
+        upload = db.session.query(cls.logotype_upload_id, cls.data).\
+            filter_by(user_id=user_id).\
+            order_by(cls.logotype_upload_id.desc()).\
+            first()
+        if upload is None:
+            return None
+        cls.query.\
+            filter(cls.user_id == user_id, cls.logotype_upload_id <= upload.logotype_upload_id).\
+            delete(synchronize_session=False)
+        return upload.data
+
+
+class RepostDelivery(db.Model):
+    """Delivery of post to subscribed service, so delivered post not sent again on retry of task"""
+    __tablename__ = 'repost_delivery'
+    __table_args__ = (
+        db.UniqueConstraint('post_id', 'service_subscribe_id', name='repost_delivery_post_id_service_subscribe_id_key'),
+    )
+
+    repost_delivery_id = db.Column(db.Integer, primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.post_id', ondelete='CASCADE'), nullable=False)
+    post = db.relationship('Post')
+    post_url = db.Column(db.Text, nullable=True)
+    service_subscribe_id = db.Column(db.Integer,
+                                     db.ForeignKey('service_subscribe.service_subscribe_id', ondelete='CASCADE'),
+                                     nullable=False)
+    service_subscribe = db.relationship('ServiceSubscribe')
+    status = db.Column(db.String(32), nullable=False, default=DeliveryStatus.PENDING.name)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    updated = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @classmethod
+    def create_pending(cls, post_id, user_id, post_url, service_subscribe_id=None):
+        """Create pending deliveries of post for alive services of user, which not created before
+
+        :param post_id: Reposted post
+        :param user_id: Owner of post
+        :param post_url: External url of post
+        :param service_subscribe_id: Create delivery only for this service (None for all services of user)
+        """
+        table = cls.__table__
+        services = db.and_(ServiceSubscribe.user_id == user_id, ServiceSubscribe.alive.is_(True))
+        if service_subscribe_id is not None:
+            services = db.and_(services, ServiceSubscribe.service_subscribe_id == service_subscribe_id)
+        db.session.execute(table.insert().from_select(
+            [table.c.post_id, table.c.post_url, table.c.service_subscribe_id, table.c.status, table.c.attempts,
+             table.c.updated],
+            db.select([db.literal(post_id),
+                       db.literal(post_url),
+                       ServiceSubscribe.service_subscribe_id,
+                       db.literal(DeliveryStatus.PENDING.name),
+                       db.literal(0),
+                       db.literal(datetime.utcnow(), db.DateTime)]).
+            where(db.and_(services,
+                          ~db.exists().where(db.and_(table.c.post_id == post_id,
+                                                     table.c.service_subscribe_id ==
+                                                     ServiceSubscribe.service_subscribe_id))))))
+
+    @classmethod
+    def claim(cls, repost_delivery_id):
+        """Count attempt of pending delivery, row locked until end of transaction
+
+        :return: False if delivery already delivered or failed
+        """
+        return bool(cls.query.
+                    filter_by(repost_delivery_id=repost_delivery_id, status=DeliveryStatus.PENDING.name).
+                    update({cls.attempts: cls.attempts + 1}, synchronize_session=False))
+
+    @classmethod
+    def claim_all(cls, service_subscribe_id):
+        """Count attempt of all pending deliveries to service, rows locked until end of transaction
+
+        Deliveries locked by other transaction skipped, so every delivery sent by one task.
+
+        :return: List of (repost_delivery_id, post title, post url)
+        """
+        deliveries = db.session.query(cls.repost_delivery_id, Post.title, cls.post_url).\
+            join(cls.post).\
+            filter(cls.service_subscribe_id == service_subscribe_id, cls.status == DeliveryStatus.PENDING.name).\
+            order_by(cls.repost_delivery_id).\
+            with_for_update(of=cls, skip_locked=True).\
+            all()
+        if deliveries:
+            cls.query.\
+                filter(cls.repost_delivery_id.in_([_[0] for _ in deliveries])).\
+                update({cls.attempts: cls.attempts + 1}, synchronize_session=False)
+        return deliveries
+
+    @classmethod
+    def deliver(cls, repost_delivery_ids):
+        cls.query.\
+            filter(cls.repost_delivery_id.in_(repost_delivery_ids)).\
+            update({cls.status: DeliveryStatus.DELIVERED.name, cls.updated: datetime.utcnow()},
+                   synchronize_session=False)
+
+    @classmethod
+    def fail(cls, repost_delivery_ids, error, final):
+        """Save error of deliveries
+
+        :param repost_delivery_ids: Failed deliveries
+        :param error: Exception or message
+        :param final: Deliveries will not be retried
+        """
+        values = {cls.last_error: str(error), cls.updated: datetime.utcnow()}
+        if final:
+            values[cls.status] = DeliveryStatus.FAILED.name
+        cls.query.\
+            filter(cls.repost_delivery_id.in_(repost_delivery_ids)).\
+            update(values, synchronize_session=False)
@@ -0,0 +1,60 @@
+import logging
+from time import sleep
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from words.ext import db, celery
+from words.models import Outbox
+
+
+logger = logging.getLogger(__name__)
+
+
+def relay(batch_size):
+    """Send tasks from outbox to broker and delete sent tasks
+
+    Rows locked with SKIP LOCKED, so several relays can be run. Task can be sent twice if relay stopped between
+    sending and commit.
+
+    :param batch_size: Maximal count of tasks sent in one transaction
+    :return: Count of sent tasks
+    """
+    sent = 0
+    while True:
+        entries = Outbox.query.\
+            order_by(Outbox.outbox_id).\
+            limit(batch_size).\
+            with_for_update(skip_locked=True).\
+            all()
+        if not entries:
+            db.session.commit()
+            return sent
+        with celery.producer_or_acquire() as producer:
+            for entry in entries:
+                celery.send_task(entry.task, entry.args, producer=producer)
+        Outbox.query.\
+            filter(Outbox.outbox_id.in_([_.outbox_id for _ in entries])).\
+            delete(synchronize_session=False)
+        db.session.commit()
+        sent += len(entries)
+
+
+@click.command('outbox-relay')
+@click.option('--once', is_flag=True, help='Send all tasks and exit')
+@with_appcontext
+def relay_command(once):
+    """Send tasks from outbox to broker"""
+    while True:
+        try:
+            sent = relay(current_app.config['OUTBOX_BATCH_SIZE'])
+            if sent:
+                logger.info('outbox relay sent %d tasks', sent)
+        except Exception:
+            # Broker or database is not available, tasks kept in outbox until next try
+            logger.exception('outbox relay')
+            db.session.rollback()
+        if once:
+            return
+        sleep(current_app.config['OUTBOX_POLL_INTERVAL'])
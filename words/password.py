@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+
+from werkzeug.exceptions import ServiceUnavailable
+
+
+class PasswordHasher:
+    """Hash and check passwords by bcrypt in bounded thread pool
+
+    Hashing run in pool with PASSWORD_HASH_WORKERS threads (bcrypt release GIL while hashing), so burst of sign in can
+    not take all CPU of worker. If more than PASSWORD_HASH_QUEUE hashes wait for pool ServiceUnavailable (503) raised.
+    """
+    def __init__(self, bcrypt):
+        """
+        :param bcrypt: Flask-Bcrypt extension
+        """
+        self.bcrypt = bcrypt
+        self.log_rounds = None
+        self._executor = None
+        self._slots = None
+
+    def init_app(self, app):
+        self.log_rounds = app.config['BCRYPT_LOG_ROUNDS']
+        workers = app.config['PASSWORD_HASH_WORKERS']
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='password-hash')
+        self._slots = BoundedSemaphore(workers + app.config['PASSWORD_HASH_QUEUE'])
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise ServiceUnavailable()
+        try:
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def generate_password_hash(self, password):
+        """Hash password with configured work factor (BCRYPT_LOG_ROUNDS)"""
+        return self._run(self.bcrypt.generate_password_hash, password)
+
+    def check_password_hash(self, pw_hash, password):
+        """Check password by hash"""
+        return self._run(self.bcrypt.check_password_hash, bytes(pw_hash), password)
+
+    def needs_rehash(self, pw_hash):
+        """Check what hash created with other work factor than configured"""
+        return int(bytes(pw_hash).split(b'$')[2]) != self.log_rounds
@@ -1,13 +1,24 @@
 from math import ceil
+from datetime import datetime
+from functools import wraps
+from itertools import islice
+from hashlib import sha1
 from xml.etree.ElementTree import Element, SubElement, ElementTree
 from io import BytesIO
 from email.utils import format_datetime
+from xml.sax.saxutils import escape
 
 from sqlalchemy.orm.exc import NoResultFound
-from flask import Blueprint, render_template, current_app, g, abort, redirect, url_for
+from werkzeug.http import is_resource_modified
+from flask import (Blueprint, Response, render_template, current_app, g, abort, redirect, url_for, request, make_response,
+                   stream_with_context)
 
-from words.models import User, Post, PostTag
-from words.ext import db
+from words.models import User, Post, PostTag, TagCount
+from words.ext import db, page_cache, purger
+from words.cache import LRUCache
+from words.changes import on_commit
+from words.search import search
+from words.surrogate import add_keys, post_keys, tagged
 
 
 bp = Blueprint('post', __name__, url_prefix='/user/<username>')
@@ -23,6 +34,107 @@ def pull_user_global():
     g.post_user = User.query.filter_by(username=current_app.config['BRAND']).one()
 
 
+def paginate(query, page, allow_empty=False):
+    """Paginate posts query by cursor (request argument `before` - post_id of last seen post) or by page number
+
+    Cursor mode not count total posts and not use OFFSET, so cost of any page same as cost of first page.
+
+    :param query: Posts query
+    :param page: Page number (used if cursor not set)
+    :param allow_empty: Show first page if query is empty (else 404)
+    :return: (posts, total pages (None for cursor mode), post_id for next page cursor (None if it last page))
+    """
+    post_per_page = current_app.config['POST_PER_PAGE']
+    before = request.args.get('before', type=int)
+    if before is None:
+        total_posts = query.with_entities(db.func.count(Post.post_id)).scalar() or 0
+        total_pages = ceil(total_posts / post_per_page)
+        if total_pages == 0 and allow_empty:
+            total_pages = 1
+        if page < 1 or page > total_pages:
+            raise abort(404)
+        offset = (page - 1) * post_per_page
+    else:
+        total_pages = None
+        offset = None
+        query = query.filter(Post.post_id < before)
+    posts = query.\
+        options(db.selectinload(Post.user), db.selectinload(Post.post_tags)).\
+        order_by(Post.post_id.desc()).\
+        offset(offset).\
+        limit(post_per_page + 1).\
+        all()
+    if not posts and before is not None:
+        raise abort(404)
+    if len(posts) > post_per_page:
+        return posts[:post_per_page], total_pages, posts[post_per_page - 1].post_id
+    return posts, total_pages, None
+
+
+@on_commit
+def invalidate_pages(changes):
+    """Invalidate cached pages of changed users (global pages show posts and profiles of all users)"""
+    namespaces = set()
+    for change in changes:
+        if change.model in ('User', 'Post', 'ServiceSubscribe'):
+            if change.user_id is None:
+                namespaces.add('all')
+            else:
+                namespaces.add('user:{}'.format(change.user_id))
+                if change.model != 'ServiceSubscribe':
+                    namespaces.add('global')
+    page_cache.invalidate(*namespaces)
+
+
+@on_commit
+def purge_surrogate_keys(changes):
+    """Purge surrogate keys of changed posts, their tags and changed users"""
+    post_users = {_.post_id: _.user_id for _ in changes if _.model == 'Post'}
+    keys = set()
+    for change in changes:
+        if change.model == 'Post':
+            keys.update(('post:{}'.format(change.post_id), 'global'))
+            if change.user_id is not None:
+                keys.add('user:{}'.format(change.user_id))
+        elif change.model == 'PostTag' and post_users.get(change.post_id) is not None:
+            keys.add('tag:{}:{}'.format(post_users[change.post_id], change.tag))
+        elif change.model == 'User':
+            keys.update(('profile:{}'.format(change.user_id), 'user:{}'.format(change.user_id), 'global'))
+    purger.purge(keys)
+
+
+def user_namespace():
+    return 'user:{}'.format(g.post_user.user_id)
+
+
+FRAGMENT_HEADER = 'X-Fragment'
+
+
+def is_fragment():
+    """Request of fragment mode (only posts and next link) by argument `fragment=1` or X-Fragment header"""
+    return request.args.get('fragment') == '1' or request.headers.get(FRAGMENT_HEADER) == '1'
+
+
+def fragmented(view):
+    """Decorate view which render fragment in fragment mode (response vary by X-Fragment header)"""
+    @wraps(view)
+    def _fragmented_wraps(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        response.vary.add(FRAGMENT_HEADER)
+        return response
+    return _fragmented_wraps
+
+
+def render_posts(template, **context):
+    """Render template or only posts and next link in fragment mode (used by infinite scroll)"""
+    if is_fragment():
+        return render_template('post/fragment.html', posts=context['posts'], next_url=context['next_url'])
+    return render_template(template, **context)
+
+
+@page_cache.cached(lambda: 'global', vary=(FRAGMENT_HEADER, ))
+@fragmented
+@tagged
 def global_posts(page):
     """Global related posts
     """
@@ -30,46 +142,115 @@ def global_posts(page):
         pull_user_global()
     except NoResultFound:
         return redirect(url_for('user.sign_up'))
-    post_per_page = current_app.config['POST_PER_PAGE']
-    total_posts = db.session.query(db.func.count(Post.post_id)).scalar() or 0
-    total_pages = ceil(total_posts / post_per_page)
-    if total_pages == 0:
-        total_pages = 1
-    if page < 1 or page > total_pages:
-        raise abort(404)
-    user_posts = Post.query.order_by(Post.post_id.desc()).offset((page - 1) * post_per_page).limit(post_per_page).all()
-    tags = [_[0] for _ in db.session.query(PostTag.content).all()] if page == 1 else None   # TODO: maybe in feature need limit this query
-    return render_template('post/multiple.html', page=page, total_pages=total_pages, posts=user_posts, tags=tags)
+    user_posts, total_pages, next_cursor = paginate(Post.query, page, True)
+    if total_pages is None:
+        page = None
+    tags = TagCount.top(None, current_app.config['TAGS_FOR_CLOUD']) if page == 1 and not is_fragment() else None
+    add_keys('global', *post_keys(user_posts))
+    return render_posts('post/multiple.html', page=page, total_pages=total_pages, posts=user_posts, tags=tags,
+                        next_url=url_for('index', before=next_cursor, fragment=1) if next_cursor else None)
 
 
 @bp.route('', methods=('GET', ), defaults={'page': 1})
 @bp.route('page/<int:page>', methods=('GET', ))
+@page_cache.cached(user_namespace, vary=(FRAGMENT_HEADER, ))
+@fragmented
+@tagged
 def posts(page):
     """View for show profile posts
 
-    :param page: Page for show
+    :param page: Page for show (argument `before` switch view to cursor mode)
     """
-    post_per_page = current_app.config['POST_PER_PAGE']
-    total_user_posts = db.session.query(db.func.count(Post.post_id)).\
-                           filter_by(user_id=g.post_user.user_id).\
-                           scalar() or 0
-    total_pages = ceil(total_user_posts / post_per_page)
-    if total_pages == 0:
-        total_pages = 1
-    if page < 1 or page > total_pages:
+    user_posts, total_pages, next_cursor = paginate(Post.query.filter_by(user_id=g.post_user.user_id), page, True)
+    if total_pages is None:
+        page = None
+    user_tags = TagCount.top(g.post_user.user_id, current_app.config['TAGS_FOR_CLOUD']) \
+        if page == 1 and not is_fragment() else None
+    add_keys('user:{}'.format(g.post_user.user_id), *post_keys(user_posts))
+    return render_posts('post/multiple.html', page=page, total_pages=total_pages, posts=user_posts, tags=user_tags,
+                        next_url=url_for('post.posts', username=g.post_user.username, before=next_cursor, fragment=1)
+                        if next_cursor else None)
+
+
+def search_cursor():
+    """Cursor of search from request argument `before` (rank:post_id)"""
+    try:
+        rank, post_id = request.args['before'].split(':')
+        return int(rank), int(post_id)
+    except (KeyError, ValueError):
+        return None
+
+
+def render_search(user_id, endpoint, **values):
+    """Render search results by request argument `q`
+
+    :param user_id: Search only posts of this user (None for all posts)
+    :param endpoint: Endpoint of search view
+    :param values: Values for build url of search view
+    """
+    text = request.args.get('q', '')
+    user_posts, next_cursor = search(text, user_id, search_cursor(), current_app.config['POST_PER_PAGE'])
+    if not user_posts and 'before' in request.args:
         raise abort(404)
-    user_posts = Post.query.\
-        filter_by(user_id=g.post_user.user_id).\
-        order_by(Post.post_id.desc()).\
-        offset((page - 1) * post_per_page).\
-        limit(post_per_page).\
-        all()
-    user_tags = [_[0]
-                 for _ in db.session.query(PostTag.content).
-                     join(PostTag.post).
-                     filter(Post.user_id == g.post_user.user_id).
-                     all()] if page == 1 else None
-    return render_template('post/multiple.html', page=page, total_pages=total_pages, posts=user_posts, tags=user_tags)
+    add_keys('user:{}'.format(user_id) if user_id is not None else 'global', *post_keys(user_posts))
+    return render_template('post/search.html', q=text, posts=user_posts, search_url=url_for(endpoint, **values),
+                           next_url=url_for(endpoint, q=text, before='{}:{}'.format(*next_cursor), **values)
+                           if next_cursor else None)
+
+
+@tagged
+def global_search():
+    """Search in all posts"""
+    try:
+        pull_user_global()
+    except NoResultFound:
+        return redirect(url_for('user.sign_up'))
+    return render_search(None, 'index_search')
+
+
+@bp.route('search', methods=('GET', ))
+@tagged
+def posts_search():
+    """Search in user posts"""
+    return render_search(g.post_user.user_id, 'post.posts_search', username=g.post_user.username)
+
+
+def posts_validator(user_id, edited, *columns):
+    """Cheap validator of posts based on last edited time and count of posts (calculated by one query)
+
+    :param user_id: Owner of posts (None for all posts)
+    :param edited: Edited time of owner (None if not used)
+    :param columns: Additional scalar SQL expressions, datetime values also used for Last-Modified
+    :return: (etag, last modified)
+    """
+    query = db.session.query(db.func.max(Post.edited), db.func.count(Post.post_id), *columns)
+    if user_id is not None:
+        query = query.filter(Post.user_id == user_id)
+    values = tuple(query.one()) + (edited, )
+    last_modified = max((_ for _ in values if isinstance(_, datetime)), default=None)
+    return sha1(repr(values).encode('utf8')).hexdigest(), last_modified
+
+
+def conditional(validator):
+    """Decorate view for answer 304 Not Modified using validator before view call
+
+    :param validator: Callable without arguments, return (etag, last modified or None)
+    """
+    def _conditional(view):
+        @wraps(view)
+        def _conditional_wraps(*args, **kwargs):
+            etag, last_modified = validator()
+            if not is_resource_modified(request.environ, etag, last_modified=last_modified):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            return response
+        return _conditional_wraps
+    return _conditional
 
 
 def get_feed(page_link, self_link, user_posts):
@@ -116,18 +297,28 @@ def get_feed(page_link, self_link, user_posts):
 
 
 @bp.route('/feed', methods=('GET', ))
+@conditional(lambda: posts_validator(g.post_user.user_id, g.post_user.edited))
+@tagged
 def posts_feed():
     """View for RSS (Return POST_PER_PAGE posts)"""
+    add_keys('user:{}'.format(g.post_user.user_id))
     return get_feed(url_for('post.posts', username=g.post_user.username, _external=True),
                     url_for('post.posts_feed', username=g.post_user.username, _external=True),
                     Post.query.filter_by(user_id=g.post_user.user_id).
+                    options(db.selectinload(Post.user)).
                     order_by(Post.post_id.desc()).
                     limit(current_app.config['POST_PER_PAGE']).
                     all())
 
 
+@conditional(lambda: posts_validator(None, None,
+                                     db.session.query(User.edited).
+                                     filter(User.username == current_app.config['BRAND']).
+                                     as_scalar()))
+@tagged
 def global_feed():
     """View for global RSS feed (Return POST_PER_PAGE posts)"""
+    add_keys('global')
     try:
         pull_user_global()
     except NoResultFound:
@@ -135,113 +326,205 @@ def global_feed():
     return get_feed(url_for('index', _external=True),
                     url_for('index_feed', _external=True),
                     Post.query.
+                    options(db.selectinload(Post.user)).
                     order_by(Post.post_id.desc()).
                     limit(current_app.config['POST_PER_PAGE']).
                     all())
 
 
 @bp.route('post/<postname>', methods=('GET', ))
+@page_cache.cached(user_namespace)
+@tagged
 def post(postname):
     """View post for username and postname
 
     :param postname: Postname for show post
     """
     user_post = Post.query.filter_by(user_id=g.post_user.user_id, url=postname).first_or_404()
+    add_keys('post:{}'.format(user_post.post_id), 'profile:{}'.format(g.post_user.user_id))
     return render_template('post/single.html', post=user_post)
 
 
 @bp.route('tag/<tagname>', methods=('GET', ), defaults={'page': 1})
 @bp.route('tag/<tagname>/page/<int:page>', methods=('GET', ))
+@page_cache.cached(user_namespace, vary=(FRAGMENT_HEADER, ))
+@fragmented
+@tagged
 def posts_by_tag(tagname, page):
     """View for show profile posts by tag
 
     :param tagname: Tagname for show posts
-    :param page: Page for show
+    :param page: Page for show (argument `before` switch view to cursor mode)
+    """
+    user_posts, total_pages, next_cursor = paginate(db.session.query(Post).
+                                                    select_from(PostTag).
+                                                    join(PostTag.post).
+                                                    filter(Post.user_id == g.post_user.user_id,
+                                                           PostTag.content == tagname),
+                                                    page)
+    if total_pages is None:
+        page = None
+    add_keys('tag:{}:{}'.format(g.post_user.user_id, tagname), 'profile:{}'.format(g.post_user.user_id),
+             *post_keys(user_posts))
+    return render_posts('post/multiple-tag.html', tag=tagname, page=page, total_pages=total_pages, posts=user_posts,
+                        next_url=url_for('post.posts_by_tag', username=g.post_user.username, tagname=tagname,
+                                         before=next_cursor, fragment=1) if next_cursor else None)
+
+
+SITEMAP_NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+SITEMAP_URLS_LIMIT = 50000
+
+
+def sitemap_xml(root, item, entries):
+    """Generate sitemap xml by chunks for streaming
+
+    :param root: Root element name (urlset or sitemapindex)
+    :param item: Entry element name (url or sitemap)
+    :param entries: Iterable of (loc, lastmod or None)
+    """
+    yield "<?xml version='1.0' encoding='UTF-8'?>\n<{} xmlns=\"{}\">".format(root, SITEMAP_NAMESPACE)
+    for loc, lastmod in entries:
+        yield '<{0}><loc>{1}</loc>{2}</{0}>'.\
+            format(item, escape(loc),
+                   '<lastmod>{}</lastmod>'.format(lastmod.strftime('%Y-%m-%dT%H:%M:%S+00:00')) if lastmod else '')
+    yield '</{}>'.format(root)
+
+
+def sitemap_response(root, item, entries):
+    """Streamed sitemap response, see sitemap_xml"""
+    return Response(stream_with_context(sitemap_xml(root, item, entries)), content_type='text/xml')
+
+
+def user_sitemap_urls(start=0, stop=None):
+    """Urls of g.post_user sitemap
+
+    :param start: Index of first url
+    :param stop: Index after last url (None for all urls)
+    :return: (total urls, iterable of (loc, lastmod or None) from start to stop)
     """
     post_per_page = current_app.config['POST_PER_PAGE']
-    total_user_posts = db.session.query(db.func.count(Post.post_id)).\
-                           select_from(PostTag).\
-                           join(PostTag.post).\
-                           filter(Post.user_id == g.post_user.user_id, PostTag.content == tagname).\
-                           scalar() or 0
-    total_pages = ceil(total_user_posts / post_per_page)
-    if page < 1 or page > total_pages:
-        raise abort(404)
-    user_posts = db.session.query(Post).\
-        select_from(PostTag).\
-        join(PostTag.post).\
-        filter(Post.user_id == g.post_user.user_id, PostTag.content == tagname).\
-        order_by(Post.post_id.desc()).\
-        offset((page - 1) * post_per_page).\
-        limit(post_per_page).\
+    username = g.post_user.username
+    total_posts = db.session.query(db.func.count(Post.post_id)).\
+                      filter_by(user_id=g.post_user.user_id).\
+                      scalar() or 0
+    total_pages = ceil(total_posts / post_per_page)
+    tags = db.session.query(TagCount.tag, TagCount.post_count).\
+        filter_by(user_id=g.post_user.user_id).\
+        order_by(TagCount.tag).\
         all()
-    return render_template('post/multiple-tag.html', tag=tagname, page=page, total_pages=total_pages, posts=user_posts)
+    total_lists = max(total_pages, 1) + sum(ceil(tag_total_posts / post_per_page) for _, tag_total_posts in tags)
+    total_urls = total_lists + total_posts
+
+    def list_urls():
+        yield url_for('post.posts', username=username, _external=True), None
+        for page in range(2, total_pages + 1):
+            yield url_for('post.posts', username=username, page=page, _external=True), None
+        for tag, tag_total_posts in tags:
+            yield url_for('post.posts_by_tag', username=username, tagname=tag, _external=True), None
+            for page in range(2, ceil(tag_total_posts / post_per_page) + 1):
+                yield url_for('post.posts_by_tag', username=username, tagname=tag, page=page, _external=True), None
+
+    def urls():
+        yield from islice(list_urls(), start, stop)
+        if stop is not None and stop <= total_lists:
+            return
+        # Posts of part selected by query, so posts of previous parts not loaded
+        posts = db.session.query(Post.url, Post.edited).\
+            filter_by(user_id=g.post_user.user_id).\
+            order_by(Post.post_id.desc()).\
+            offset(max(start - total_lists, 0))
+        if stop is not None:
+            posts = posts.limit(stop - max(start, total_lists))
+        for url, edited in posts.yield_per(1000):
+            yield url_for('post.post', username=username, postname=url, _external=True), edited
+
+    return total_urls, urls()
 
 
 @bp.route('/sitemap.xml', methods=('GET', ))
+@conditional(lambda: posts_validator(g.post_user.user_id, g.post_user.edited))
+@tagged
 def posts_sitemap():
-    post_per_page = current_app.config['POST_PER_PAGE']
+    """Sitemap of user, it become sitemap index of parts if urls more than SITEMAP_URLS_LIMIT"""
+    add_keys('user:{}'.format(g.post_user.user_id))
+    total_urls, urls = user_sitemap_urls()
+    if total_urls <= SITEMAP_URLS_LIMIT:
+        return sitemap_response('urlset', 'url', urls)
+    return sitemap_response('sitemapindex', 'sitemap',
+                            ((url_for('post.posts_sitemap_part', username=g.post_user.username, part=part,
+                                      _external=True), None)
+                             for part in range(1, ceil(total_urls / SITEMAP_URLS_LIMIT) + 1)))
+
+
+@bp.route('/sitemap-<int:part>.xml', methods=('GET', ))
+@conditional(lambda: posts_validator(g.post_user.user_id, g.post_user.edited))
+@tagged
+def posts_sitemap_part(part):
+    """Part of user sitemap (SITEMAP_URLS_LIMIT urls per part)
+
+    :param part: Part number from 1
+    """
+    add_keys('user:{}'.format(g.post_user.user_id))
+    total_urls, urls = user_sitemap_urls((part - 1) * SITEMAP_URLS_LIMIT, part * SITEMAP_URLS_LIMIT)
+    if part < 1 or (part - 1) * SITEMAP_URLS_LIMIT >= total_urls:
+        raise abort(404)
+    return sitemap_response('urlset', 'url', urls)
+
+
+global_sitemap_cache = LRUCache(1)
+
 
-    url_set = Element('urlset', {'xmlns': 'http://www.sitemaps.org/schemas/sitemap/0.9', })
-
-    root_total_posts = db.session.query(db.func.count(Post.post_id)).\
-                           filter_by(user_id=g.post_user.user_id).\
-                           scalar() or 0
-    root_total_pages = ceil(root_total_posts / post_per_page)
-    root_url = SubElement(url_set, 'url')
-    root_url_loc = SubElement(root_url, 'loc')
-    root_url_loc.text = url_for('post.posts', username=g.post_user.username, _external=True)
-    for page in range(2, root_total_pages):
-        root_url_page = SubElement(url_set, 'url')
-        root_url_page_loc = SubElement(root_url_page, 'loc')
-        root_url_page_loc.text = url_for('post.posts', username=g.post_user.username, page=page, _external=True)
-
-    tag_query = db.session.query(PostTag.content).\
-        join(PostTag.post).\
-        filter(Post.user_id == g.post_user.user_id).\
-        group_by(PostTag.content)
-    for tag, in tag_query.all():
-        tag_total_posts = db.session.query(db.func.count(Post.post_id)).\
-                              select_from(PostTag).\
-                              join(PostTag.post).\
-                              filter(Post.user_id == g.post_user.user_id, PostTag.content == tag).\
-                              scalar() or 0
-        tag_total_pages = ceil(tag_total_posts / post_per_page)
-        tag_url = SubElement(url_set, 'url')
-        tag_url_loc = SubElement(tag_url, 'loc')
-        tag_url_loc.text = url_for('post.posts_by_tag', username=g.post_user.username, tagname=tag, _external=True)
-        for page in range(2, tag_total_pages):
-            tag_url_page = SubElement(url_set, 'url')
-            tag_url_page_loc = SubElement(tag_url_page, 'loc')
-            tag_url_page_loc.text = url_for('post.posts_by_tag', username=g.post_user.username, tagname=tag, page=page, _external=True)
-
-    for user_post in Post.query.filter_by(user_id=g.post_user.user_id).order_by(Post.post_id.desc()).all():
-        post_url = SubElement(url_set, 'url')
-        post_url_loc = SubElement(post_url, 'loc')
-        post_url_loc.text = url_for('post.post', username=g.post_user.username, postname=user_post.url, _external=True)
-        post_url_lastmod = SubElement(post_url, 'lastmod')
-        post_url_lastmod.text = user_post.edited.strftime('%Y-%m-%dT%H:%M:%S+00:00')
-
-    buffer_sitemap = BytesIO()
-    ElementTree(url_set).write(buffer_sitemap, 'UTF-8', True)
-    return buffer_sitemap.getvalue().decode('utf8'), {'content-type': 'text/xml'}
+@bp.record_once
+def init_global_sitemap_cache(state):
+    global_sitemap_cache.ttl = state.app.config['GLOBAL_SITEMAP_CACHE_TTL']
 
 
+@on_commit
+def invalidate_global_sitemap(changes):
+    if any(_.model in ('User', 'Post') for _ in changes):
+        global_sitemap_cache.clear()
+
+
+def render_global_sitemap():
+    """Render sitemap index of all users sitemaps (last modification time calculated by one grouped query)"""
+    users = db.session.query(User.username, db.func.coalesce(db.func.max(Post.edited), User.edited)).\
+        outerjoin(User.posts).\
+        filter(User.username != current_app.config['BRAND']).\
+        group_by(User.user_id).\
+        order_by(User.user_id).\
+        all()
+    return ''.join(sitemap_xml('sitemapindex', 'sitemap',
+                               ((url_for('post.posts_sitemap', username=username, _external=True), last_edited)
+                                for username, last_edited in users)))
+
+
+@conditional(lambda: posts_validator(None, None,
+                                     db.session.query(db.func.max(User.edited)).as_scalar(),
+                                     db.session.query(db.func.count(User.user_id)).as_scalar()))
+@tagged
 def global_sitemap():
-    """Global sitemap.xml for global level"""
-    sitemap_index = Element('sitemapindex', {'xmlns': 'http://www.sitemaps.org/schemas/sitemap/0.9', })
-    for user in User.query.filter(User.username != current_app.config['BRAND']).all():
-        sitemap = SubElement(sitemap_index, 'sitemap')
-        sitemap_loc = SubElement(sitemap, 'loc')
-        sitemap_loc.text = url_for('post.posts_sitemap', username=user.username, _external=True)
-        sitemap_lastmod = SubElement(sitemap, 'lastmod')
-        last_edited = db.session.query(Post.edited).\
-                          filter_by(user_id=user.user_id).\
-                          order_by(Post.post_id.desc()).\
-                          limit(1).\
-                          scalar() or user.edited
-        sitemap_lastmod.text = last_edited.strftime('%Y-%m-%dT%H:%M:%S+00:00')
-
-    buffer_sitemap = BytesIO()
-    ElementTree(sitemap_index).write(buffer_sitemap, 'UTF-8', True)
-    return buffer_sitemap.getvalue().decode('utf8'), {'content-type': 'text/xml'}
+    """Global sitemap.xml for global level (cached until users or posts changed)"""
+    add_keys('global')
+    return global_sitemap_cache.get_or_set('sitemap', render_global_sitemap), {'content-type': 'text/xml'}
+
+
+def logotype_response(logotype_data):
+    """Response with JPG logotype with strong ETag, it url versioned by User.logotype_url so it cached for long time"""
+    response = make_response(logotype_data)
+    response.content_type = 'image/jpeg'
+    response.set_etag(sha1(logotype_data).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['LOGOTYPE_MAX_AGE']
+    return response.make_conditional(request)
+
+
+@bp.route('/logotype.jpg', methods=('GET', ))
+def logotype():
+    """User logotype"""
+    return logotype_response(db.session.query(User.logotype).filter_by(user_id=g.post_user.user_id).scalar())
+
+
+@bp.route('/logotype-small.jpg', methods=('GET', ))
+def logotype_small():
+    """User small logotype for lists"""
+    return logotype_response(db.session.query(User.logotype_small).filter_by(user_id=g.post_user.user_id).scalar())
@@ -0,0 +1,121 @@
+from threading import Lock
+from time import time, sleep
+
+from sqlalchemy.exc import IntegrityError
+
+from words.ext import db
+from words.models import RateLimitBucket
+
+
+RATE_PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60}
+
+
+def parse_rate(rate):
+    """Parse rate like '30/s' or '20/m'
+
+    :param rate: Count of tokens per period (s, m or h)
+    :return: (capacity of bucket, tokens per second)
+    """
+    count, period = rate.split('/')
+    return float(count), float(count) / RATE_PERIODS[period]
+
+
+def take(states, limits, now):
+    """Take one token from every bucket or nothing if any bucket is empty
+
+    :param states: Dict name: (tokens, updated) of stored buckets (missing bucket is full)
+    :param limits: Dict name: (capacity, tokens per second)
+    :param now: Current time in seconds
+    :return: (seconds to wait for token (0 if taken), dict name: (tokens, updated) to store)
+    """
+    tokens = {}
+    for name, (capacity, per_second) in limits.items():
+        stored, updated = states.get(name, (capacity, now))
+        tokens[name] = min(capacity, stored + max(0, now - updated) * per_second)
+    wait = max((1 - tokens[name]) / limits[name][1] for name in tokens)
+    if wait > 0:
+        return wait, {}
+    return 0, {name: (value - 1, now) for name, value in tokens.items()}
+
+
+class MemoryStorage:
+    """Buckets in memory of process (only for single worker process)"""
+    def __init__(self):
+        self._buckets = {}
+        self._lock = Lock()
+
+    def acquire(self, limits):
+        with self._lock:
+            wait, states = take(self._buckets, limits, time())
+            self._buckets.update(states)
+            return wait
+
+
+class DatabaseStorage:
+    """Buckets in rate_limit_bucket table, rows locked while token taken"""
+    def acquire(self, limits):
+        table = RateLimitBucket.__table__
+        while True:
+            try:
+                with db.engine.begin() as connection:
+                    rows = connection.execute(db.select([table]).
+                                              where(table.c.name.in_(sorted(limits))).
+                                              order_by(table.c.name).
+                                              with_for_update()).\
+                        fetchall()
+                    stored = {_.name: (_.tokens, _.updated) for _ in rows}
+                    wait, states = take(stored, limits, time())
+                    for name, (tokens, updated) in states.items():
+                        if name in stored:
+                            connection.execute(table.update().
+                                               where(table.c.name == name).
+                                               values(tokens=tokens, updated=updated))
+                        else:
+                            connection.execute(table.insert().values(name=name, tokens=tokens, updated=updated))
+                    return wait
+            except IntegrityError:
+                # Bucket created by other process, take token again with locked row
+                continue
+
+
+class RateLimiter:
+    """Token bucket rate limiter shared by worker processes
+
+    Rates configured in RATE_LIMITS as dict kind: rate ('30/s'), bucket name is kind or 'kind:key' (bucket per key
+    with same rate). Buckets stored in database (RATE_LIMIT_STORAGE = 'database') or in memory of process ('memory').
+    """
+    def __init__(self):
+        self.rates = {}
+        self.max_wait = 0
+        self.storage = None
+
+    def init_app(self, app):
+        self.rates = {kind: parse_rate(rate) for kind, rate in app.config['RATE_LIMITS'].items()}
+        self.max_wait = app.config['RATE_LIMIT_MAX_WAIT']
+        self.storage = DatabaseStorage() if app.config['RATE_LIMIT_STORAGE'] == 'database' else MemoryStorage()
+
+    def acquire(self, names):
+        """Take token from every bucket
+
+        :param names: Names of buckets
+        :return: Seconds to wait for token (0 if token taken)
+        """
+        if not names:
+            return 0
+        return self.storage.acquire({_: self.rates[_.split(':', 1)[0]] for _ in names})
+
+    def wait(self, names):
+        """Take token from every bucket, sleep while wait for token less than RATE_LIMIT_MAX_WAIT
+
+        :param names: Names of buckets
+        :return: Seconds to wait for token (0 if token taken)
+        """
+        deadline = time() + self.max_wait
+        wait = self.acquire(names)
+        while wait and time() + wait <= deadline:
+            sleep(wait)
+            wait = self.acquire(names)
+        return wait
+
+
+rate_limiter = RateLimiter()
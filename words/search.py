@@ -0,0 +1,90 @@
+from flask import current_app
+from sqlalchemy import event
+
+from words.ext import db
+from words.models import Post
+
+
+# Rank multiplied and rounded to integer, so it can be exactly compared in cursor
+RANK_SCALE = 1000000
+
+POSTGRESQL_INDEX_CREATE = 'CREATE INDEX IF NOT EXISTS post_search_vector_idx ON post USING gin (search_vector)'
+SQLITE_FTS_CREATE = 'CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(title, content)'
+
+event.listen(Post.__table__, 'after_create', db.DDL(POSTGRESQL_INDEX_CREATE).execute_if(dialect='postgresql'))
+event.listen(Post.__table__, 'after_create', db.DDL(SQLITE_FTS_CREATE).execute_if(dialect='sqlite'))
+
+
+@event.listens_for(Post, 'before_insert')
+@event.listens_for(Post, 'before_update')
+def _update_search_vector(mapper, connection, target):
+    if connection.dialect.name == 'postgresql':
+        target.search_vector = db.func.to_tsvector(current_app.config['SEARCH_CONFIG'],
+                                                   '{} {}'.format(target.title, target.content))
+
+
+@event.listens_for(Post, 'after_insert')
+@event.listens_for(Post, 'after_update')
+def _update_sqlite_fts(mapper, connection, target):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(db.text('INSERT OR REPLACE INTO post_fts(rowid, title, content) '
+                                   'VALUES (:post_id, :title, :content)'),
+                           post_id=target.post_id, title=target.title, content=target.content)
+
+
+@event.listens_for(Post, 'after_delete')
+def _delete_sqlite_fts(mapper, connection, target):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(db.text('DELETE FROM post_fts WHERE rowid = :post_id'), post_id=target.post_id)
+
+
+def search_query(text):
+    """Query of (Post, rank) matched text, rank is integer (more is better)
+
+    Used PostgreSQL tsvector (Post.search_vector) or SQLite FTS5 (post_fts) depend on database.
+
+    :param text: User input, all words should be matched
+    :return: (query, rank expression)
+    """
+    if db.engine.dialect.name == 'postgresql':
+        ts_query = db.func.plainto_tsquery(current_app.config['SEARCH_CONFIG'], text)
+        rank = db.cast(db.func.ts_rank(Post.search_vector, ts_query) * RANK_SCALE, db.Integer)
+        return db.session.query(Post, rank).filter(Post.search_vector.op('@@')(ts_query)), rank
+    # Quote every word, so user input not parsed as FTS5 query syntax
+    fts_query = ' '.join('"{}"'.format(_.replace('"', '""')) for _ in text.split())
+    fts = db.text('SELECT rowid AS post_id, CAST(-bm25(post_fts) * :scale AS INTEGER) AS rank '
+                  'FROM post_fts WHERE post_fts MATCH :query').\
+        bindparams(scale=RANK_SCALE, query=fts_query).\
+        columns(post_id=db.Integer, rank=db.Integer).\
+        alias('fts')
+    return db.session.query(Post, fts.c.rank).join(fts, fts.c.post_id == Post.post_id), fts.c.rank
+
+
+def search(text, user_id, before, limit):
+    """Search posts ordered by rank and post_id with keyset pagination
+
+    :param text: User input
+    :param user_id: Search only posts of this user (None for all posts)
+    :param before: Cursor (rank, post_id) of last seen post or None for first page
+    :param limit: Maximal count of posts
+    :return: (posts, cursor for next page or None if it last page)
+    """
+    if not text.strip():
+        return [], None
+    query, rank = search_query(text)
+    if user_id is not None:
+        query = query.filter(Post.user_id == user_id)
+    if before:
+        before_rank, before_post_id = before
+        query = query.filter(db.or_(rank < before_rank,
+                                    db.and_(rank == before_rank, Post.post_id < before_post_id)))
+    results = query.\
+        options(db.selectinload(Post.user), db.selectinload(Post.post_tags)).\
+        order_by(rank.desc(), Post.post_id.desc()).\
+        limit(limit + 1).\
+        all()
+    posts = [_[0] for _ in results[:limit]]
+    if len(results) > limit:
+        last_post, last_rank = results[limit - 1]
+        return posts, (last_rank, last_post.post_id)
+    return posts, None
@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from os import getpid
+from urllib.request import Request, urlopen
+import logging
+
+from flask import g, make_response
+
+
+logger = logging.getLogger(__name__)
+
+
+def add_keys(*keys):
+    """Add surrogate keys to response of current request (response should be returned by view decorated by tagged)"""
+    g.surrogate_keys = getattr(g, 'surrogate_keys', set()) | set(keys)
+
+
+def post_keys(posts):
+    """Surrogate keys of shown posts"""
+    return ['post:{}'.format(_.post_id) for _ in posts]
+
+
+def tagged(view):
+    """Decorate view for set Surrogate-Key header by keys added while view called"""
+    @wraps(view)
+    def _tagged_wraps(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        keys = getattr(g, 'surrogate_keys', None)
+        if keys and response.status_code == 200:
+            response.headers['Surrogate-Key'] = ' '.join(sorted(keys))
+        return response
+    return _tagged_wraps
+
+
+class NullPurger:
+    """Purger which not purge anything (without caching proxy)"""
+    def purge(self, keys):
+        pass
+
+
+class HttpPurger:
+    """Purger which send HTTP request with keys in header to caching proxy (Varnish, Fastly and etc.)"""
+    def __init__(self, url, method='PURGE', header='Surrogate-Key', timeout=5):
+        """
+        :param url: Url of purge endpoint
+        :param method: HTTP method of request
+        :param header: Name of header for space separated keys
+        :param timeout: Timeout of request in seconds
+        """
+        self.url = url
+        self.method = method
+        self.header = header
+        self.timeout = timeout
+
+    def purge(self, keys):
+        request = Request(self.url, method=self.method, headers={self.header: ' '.join(sorted(keys))})
+        urlopen(request, timeout=self.timeout).close()
+
+
+class Purger:
+    """Purge surrogate keys in background thread by configured purger (SURROGATE_PURGER is 'null' or 'http')"""
+    def __init__(self):
+        self.purger = NullPurger()
+        self._executor = None
+        self._pid = None
+
+    def init_app(self, app):
+        if app.config['SURROGATE_PURGER'] == 'http':
+            self.purger = HttpPurger(app.config['SURROGATE_PURGE_URL'],
+                                     app.config['SURROGATE_PURGE_METHOD'],
+                                     app.config['SURROGATE_PURGE_HEADER'],
+                                     app.config['SURROGATE_PURGE_TIMEOUT'])
+        else:
+            self.purger = NullPurger()
+
+    def _purge(self, keys):
+        try:
+            self.purger.purge(keys)
+        except Exception:
+            # Cached pages expired by TTL of proxy
+            logger.exception('purge %s', ' '.join(sorted(keys)))
+
+    def purge(self, keys):
+        """Purge keys without waiting for proxy"""
+        if not keys or isinstance(self.purger, NullPurger):
+            return
+        # Thread of executor not exists in forked process (worker of celery or web server)
+        if self._pid != getpid():
+            self._executor = ThreadPoolExecutor(1, thread_name_prefix='surrogate-purge')
+            self._pid = getpid()
+        self._executor.submit(self._purge, set(keys))
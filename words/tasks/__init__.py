@@ -1,14 +1,33 @@
-from words.ext import celery
-from words.tasks import repost
+from celery.exceptions import Ignore
+from flask import g
+
+from words.ext import celery, metrics
+from words.ratelimit import rate_limiter
+from words.tasks import repost, logotype
 
 
 def init_app(app):
     celery.conf.update(app.config['CELERY'])
+    rate_limiter.init_app(app)
 
     class ContextTask(celery.Task):
+        # Static method (with arguments of task) returned names of rate limiter buckets
+        rate_buckets = None
+
         def __call__(self, *args, **kwargs):
             with app.app_context():
-                return self.run(*args, **kwargs)
+                # Name of task for slow query log
+                g.task_name = self.name
+                try:
+                    if self.rate_buckets is not None and not self.request.called_directly:
+                        wait = rate_limiter.wait(self.rate_buckets(*args, **kwargs))
+                        if wait:
+                            # Delay without retry, so waiting for rate limit not counted in max_retries
+                            self.signature_from_request(countdown=wait, retries=self.request.retries).apply_async()
+                            raise Ignore()
+                    return self.run(*args, **kwargs)
+                finally:
+                    metrics.record('task', self.name)
 
     setattr(celery, 'Task', ContextTask)
 
@@ -19,12 +38,34 @@ def repost_all(self, post_id, post_url):
 
 
 @celery.task(name='words.tasks.repost.telegram', bind=True, ignore_result=True, max_retries=3,
-             default_retry_delay=2 * 60, rate_limit='30/s')
-def repost_telegram(self, service_id, post_id, post_url):
-    repost.telegram(self, service_id, post_id, post_url)
+             default_retry_delay=2 * 60,
+             rate_buckets=staticmethod(repost.telegram_buckets))
+def repost_telegram(self, service_id, channel, deliveries):
+    # Tasks sent before deliveries payload have arguments (service_id, post_id, post_url)
+    repost.telegram(self, service_id, channel, deliveries)
 
 
 @celery.task(name='words.tasks.repost.twitter', bind=True, ignore_result=True, max_retries=3,
              default_retry_delay=2 * 60)
-def repost_twitter(self, service_id, post_id, post_url):
-    repost.twitter(self, service_id, post_id, post_url)
+def repost_twitter(self, service_id, deliveries, post_url=None):
+    # Tasks sent before deliveries payload have arguments (service_id, post_id, post_url)
+    repost.twitter(self, service_id, deliveries, post_url)
+
+
+@celery.task(name='words.tasks.repost.twitter_verify', bind=True, ignore_result=True, max_retries=3,
+             default_retry_delay=2 * 60)
+def repost_twitter_verify(self):
+    repost.twitter_verify(self)
+
+
+@celery.task(name='words.tasks.logotype.resize', bind=True, ignore_result=True, max_retries=3,
+             default_retry_delay=10, soft_time_limit=30, time_limit=60)
+def logotype_resize(self, user_id, data=None):
+    # Tasks queued before uploads staged in logotype_upload have argument data (base64 of upload)
+    logotype.resize(self, user_id, data)
+
+
+@celery.task(name='words.tasks.logotype.generate', bind=True, ignore_result=True, max_retries=3,
+             default_retry_delay=10, soft_time_limit=30, time_limit=60)
+def logotype_generate(self, user_id, text):
+    logotype.generate(self, user_id, text)
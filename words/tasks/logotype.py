@@ -0,0 +1,61 @@
+from base64 import b64decode
+from datetime import datetime
+from io import BytesIO
+
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.utils.log import get_task_logger
+from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.exc import SQLAlchemyError
+
+from words.models import User, LogotypeUpload
+from words.utils import resize_logotype, generate_logotype
+from words.ext import db
+
+
+logger = get_task_logger(__name__)
+
+
+def store(self, user_id, produce):
+    """Store logotype produced by produce() to user
+
+    :param user_id: Owner of logotype
+    :param produce: Callable without arguments, return logotype of all sizes
+    """
+    try:
+        user = User.query.filter_by(user_id=user_id).one()
+        user.logotype, user.logotype_small = produce()
+        user.edited = datetime.utcnow()
+        db.session.commit()
+    except NoResultFound:
+        pass
+    except (ValueError, SoftTimeLimitExceeded):
+        logger.warning('logotype for user %s not processed, placeholder kept', user_id)
+        # Staged upload removed, it can not be processed
+        db.session.commit()
+    except SQLAlchemyError as e:
+        logger.exception('logotype')
+        raise self.retry(exc=e)
+
+
+def resize(self, user_id, data=None):
+    """Resize uploaded logotype of user
+
+    :param user_id: Owner of logotype
+    :param data: Base64 of upload (task queued before uploads staged) or None for last staged upload
+    """
+    if data is None:
+        try:
+            data = LogotypeUpload.take(user_id)
+        except SQLAlchemyError as e:
+            logger.exception('logotype')
+            raise self.retry(exc=e)
+        if data is None:
+            # Already processed by task of later upload
+            return
+    else:
+        data = b64decode(data)
+    store(self, user_id, lambda: resize_logotype(BytesIO(data)))
+
+
+def generate(self, user_id, text):
+    store(self, user_id, lambda: generate_logotype(text))
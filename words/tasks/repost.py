@@ -1,3 +1,8 @@
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from celery import group
+from celery.signals import worker_process_init
 from celery.utils.log import get_task_logger
 from flask import current_app
 from sqlalchemy.orm.exc import NoResultFound
@@ -7,21 +12,85 @@ from telegram.error import BadRequest, Unauthorized
 from telegram.utils.request import Request
 from twitter import Api, TwitterError
 
-from words.models import Post, ServiceSubscribe, Service
+from words.models import Post, ServiceSubscribe, Service, RepostDelivery, DeliveryStatus
 from words.ext import db
 
 
 logger = get_task_logger(__name__)
 
+# Max length of telegram message in UTF-16 code units
+TELEGRAM_MESSAGE_LENGTH = 4096
+# Twitter error codes: could not authenticate, account suspended, invalid token, bad authentication data
+TWITTER_AUTH_ERRORS = {32, 64, 89, 215}
+
+
+@lru_cache(maxsize=None)
+def telegram_bot(token, proxy_url, pool_size):
+    """Telegram bot with connection pool, shared by all tasks of worker process
+
+    :param token: Bot token
+    :param proxy_url: Proxy url or None
+    :param pool_size: Size of connection pool (not less than tasks run at once by worker process)
+    """
+    return Bot(token, request=Request(con_pool_size=pool_size, proxy_url=proxy_url))
+
+
+@lru_cache(maxsize=256)
+def twitter_api(consumer_key, consumer_secret, access_token_key, access_token_secret):
+    """Twitter api client, shared by all tasks of worker process for same credentials"""
+    return Api(consumer_key, consumer_secret, access_token_key, access_token_secret)
+
+
+def twitter_client(service):
+    """Twitter api client for subscription
+
+    :param service: ServiceSubscribe of twitter
+    """
+    return twitter_api(service.credentials['consumer_key'],
+                       service.credentials['consumer_secret'],
+                       service.credentials['access_token_key'],
+                       service.credentials['access_token_secret'])
+
+
+def twitter_auth_error(e):
+    """Check what TwitterError raised by invalid credentials (not by network or rate limit)"""
+    errors = e.message if isinstance(e.message, list) else []
+    return any(isinstance(_, dict) and _.get('code') in TWITTER_AUTH_ERRORS for _ in errors)
+
+
+@worker_process_init.connect
+def reset_clients(**kwargs):
+    # Connection pools of parent process can not be used in child process
+    telegram_bot.cache_clear()
+    twitter_api.cache_clear()
+
 
 def repost(self, post_id, post_url):
     try:
-        post = Post.query.filter_by(post_id=post_id).one()
-        for services in ServiceSubscribe.query.filter_by(user_id=post.user_id, alive=True).all():
-            if services.service == Service.TELEGRAM.name:
-                self.app.send_task('words.tasks.repost.telegram', (services.service_subscribe_id, post_id, post_url))
-            elif services.service == Service.TWITTER.name:
-                self.app.send_task('words.tasks.repost.twitter', (services.service_subscribe_id, post_id, post_url))
+        user_id, title = db.session.query(Post.user_id, Post.title).filter(Post.post_id == post_id).one()
+        RepostDelivery.create_pending(post_id, user_id, post_url)
+        pending = db.session.query(RepostDelivery.repost_delivery_id,
+                                   ServiceSubscribe.service_subscribe_id,
+                                   ServiceSubscribe.service,
+                                   ServiceSubscribe.credentials).\
+            join(RepostDelivery.service_subscribe).\
+            filter(RepostDelivery.post_id == post_id,
+                   RepostDelivery.status == DeliveryStatus.PENDING.name,
+                   ServiceSubscribe.alive.is_(True)).\
+            all()
+        db.session.commit()
+        signatures = []
+        for delivery_id, service_id, service, credentials in pending:
+            # Payload of delivery, so tasks not load post and (telegram) service
+            deliveries = [[delivery_id, title, post_url]]
+            if service == Service.TELEGRAM.name:
+                signatures.append(self.app.signature('words.tasks.repost.telegram',
+                                                     (service_id, credentials['channel_name'], deliveries)))
+            elif service == Service.TWITTER.name:
+                signatures.append(self.app.signature('words.tasks.repost.twitter', (service_id, deliveries)))
+        if signatures:
+            # Delayed by coalesce window, so posts published in window sent to service by one message
+            group(signatures).apply_async(countdown=current_app.config['REPOST_COALESCE_WINDOW'] or None)
     except NoResultFound:
         pass
     except SQLAlchemyError as e:
@@ -29,41 +98,171 @@ def repost(self, post_id, post_url):
         raise self.retry(exc=e)
 
 
-def telegram(self, service_id, post_id, post_url):
+def claim(service_id, deliveries):
+    """Lock and count attempt of deliveries which should be sent by task
+
+    :param service_id: Subscribed service
+    :param deliveries: Payload of task - list of (repost_delivery_id, post title, post url)
+    :return: Pending deliveries of payload or all pending deliveries to service if REPOST_COALESCE_WINDOW is set
+    """
+    if current_app.config['REPOST_COALESCE_WINDOW']:
+        return RepostDelivery.claim_all(service_id)
+    return [_ for _ in deliveries if RepostDelivery.claim(_[0])]
+
+
+def legacy_deliveries(service_id, post_id, post_url):
+    """Payload of task sent with arguments (service_id, post_id, post_url) before deliveries payload
+
+    Tasks queued before delivery ledger have no delivery, so it created for service of task.
+
+    :return: List of (repost_delivery_id, post title, post url)
+    """
+    user_id = db.session.query(Post.user_id).filter(Post.post_id == post_id).scalar()
+    if user_id is None:
+        return []
+    RepostDelivery.create_pending(post_id, user_id, post_url, service_id)
+    return [[delivery_id, title, post_url]
+            for delivery_id, title in db.session.query(RepostDelivery.repost_delivery_id, Post.title).
+            join(RepostDelivery.post).
+            filter(RepostDelivery.post_id == post_id, RepostDelivery.service_subscribe_id == service_id).
+            all()]
+
+
+def telegram_buckets(service_id, channel, deliveries):
+    """Rate limiter buckets of telegram task: global and per channel"""
+    if isinstance(deliveries, str):
+        # Task with arguments (service_id, post_id, post_url), channel not known
+        return 'telegram', 'telegram_channel:{}'.format(service_id)
+    return 'telegram', 'telegram_channel:{}'.format(channel)
+
+
+def telegram_messages(deliveries):
+    """Join deliveries to messages not longer than TELEGRAM_MESSAGE_LENGTH
+
+    :param deliveries: List of (repost_delivery_id, post title, post url)
+    :return: List of (repost_delivery_ids, text of message)
+    """
+    messages = []
+    for delivery_id, title, url in deliveries:
+        text = '*{}*\n\n{}'.format(title, url)
+        if messages:
+            delivery_ids, message = messages[-1]
+            joined = '{}\n\n{}'.format(message, text)
+            if len(joined.encode('utf-16-le')) // 2 <= TELEGRAM_MESSAGE_LENGTH:
+                messages[-1] = (delivery_ids + [delivery_id], joined)
+                continue
+        messages.append(([delivery_id], text))
+    return messages
+
+
+def telegram(self, service_id, channel, deliveries):
     try:
-        service = ServiceSubscribe.query.filter_by(service_subscribe_id=service_id, alive=True).one()
-        post = Post.query.filter_by(post_id=post_id).one()
-        bot = Bot(current_app.config['TELEGRAM_BOT_TOKEN'],
-                  request=Request(proxy_url=current_app.config['TELEGRAM_BOT_PROXY']))
-        try:
-            bot.send_message(service.credentials['channel_name'],
-                             '*{}*\n\n{}'.format(post.title, post_url),
-                             ParseMode.MARKDOWN)
-        except (BadRequest, Unauthorized):
-            service.alive = False
+        if isinstance(deliveries, str):
+            deliveries = legacy_deliveries(service_id, channel, deliveries)
+        service = ServiceSubscribe.query.filter_by(service_subscribe_id=service_id, alive=True).first()
+        deliveries = claim(service_id, deliveries) if service else []
+        if not deliveries:
+            # Already delivered (task retried or redelivered by broker), sent by other task or service disabled
             db.session.commit()
-    except NoResultFound:
-        pass
+            return
+        bot = telegram_bot(current_app.config['TELEGRAM_BOT_TOKEN'],
+                           current_app.config['TELEGRAM_BOT_PROXY'],
+                           current_app.config['TELEGRAM_BOT_POOL_SIZE'])
+        # Committed once, so claimed deliveries stay locked until all messages sent
+        undelivered = [_[0] for _ in deliveries]
+        for delivery_ids, text in telegram_messages(deliveries):
+            try:
+                bot.send_message(service.credentials['channel_name'], text, ParseMode.MARKDOWN)
+            except (BadRequest, Unauthorized) as e:
+                if isinstance(e, BadRequest) and 'too long' in e.message.lower():
+                    # Error of message, not of channel, so service stay alive
+                    RepostDelivery.fail(delivery_ids, e, True)
+                    undelivered = [_ for _ in undelivered if _ not in delivery_ids]
+                    continue
+                service.alive = False
+                RepostDelivery.fail(undelivered, e, True)
+                db.session.commit()
+                return
+            except TelegramError as e:
+                RepostDelivery.fail(undelivered, e, self.request.retries >= self.max_retries)
+                db.session.commit()
+                raise
+            RepostDelivery.deliver(delivery_ids)
+            undelivered = [_ for _ in undelivered if _ not in delivery_ids]
+        db.session.commit()
     except (SQLAlchemyError, TelegramError) as e:
         logger.exception('telegram')
         raise self.retry(exc=e, countdown=self.default_retry_delay * (self.request.retries + 1))
 
 
-def twitter(self, service_id, post_id, post_url):
+def twitter(self, service_id, deliveries, post_url=None):
     try:
-        service = ServiceSubscribe.query.filter_by(service_subscribe_id=service_id, alive=True).one()
-        post = Post.query.filter_by(post_id=post_id).one()
-        api = Api(service.credentials['consumer_key'],
-                  service.credentials['consumer_secret'],
-                  service.credentials['access_token_key'],
-                  service.credentials['access_token_secret'])
-        if api.VerifyCredentials():
-            api.PostDirectMessage('{}\n{}'.format(post.title, post_url))
-        else:
-            service.alive = False
+        if post_url is not None:
+            deliveries = legacy_deliveries(service_id, deliveries, post_url)
+        # Credentials loaded from database, so they are not passed through broker
+        service = ServiceSubscribe.query.filter_by(service_subscribe_id=service_id, alive=True).first()
+        deliveries = claim(service_id, deliveries) if service else []
+        if not deliveries:
+            # Already delivered (task retried or redelivered by broker), sent by other task or service disabled
             db.session.commit()
-    except NoResultFound:
-        pass
+            return
+        delivery_ids = [_[0] for _ in deliveries]
+        # Credentials verified by twitter_verify, so only one request to api here
+        try:
+            twitter_client(service).PostDirectMessage('\n\n'.join('{}\n{}'.format(title, url)
+                                                                    for _, title, url in deliveries))
+        except TwitterError as e:
+            if twitter_auth_error(e):
+                service.alive = False
+                RepostDelivery.fail(delivery_ids, e, True)
+                db.session.commit()
+                return
+            RepostDelivery.fail(delivery_ids, e, self.request.retries >= self.max_retries)
+            db.session.commit()
+            raise
+        RepostDelivery.deliver(delivery_ids)
+        now = datetime.utcnow()
+        if service.verified is None or \
+                service.verified < now - timedelta(seconds=current_app.config['TWITTER_VERIFY_TTL']):
+            service.verified = now
+        db.session.commit()
     except (SQLAlchemyError, TwitterError) as e:
         logger.exception('twitter')
         raise self.retry(exc=e, countdown=self.default_retry_delay * (self.request.retries + 1))
+
+
+def twitter_verify(self):
+    """Verify credentials of twitter subscriptions not verified for TWITTER_VERIFY_TTL, mark invalid as not alive"""
+    try:
+        now = datetime.utcnow()
+        services = ServiceSubscribe.query.\
+            filter(ServiceSubscribe.service == Service.TWITTER.name,
+                   ServiceSubscribe.alive.is_(True),
+                   db.or_(ServiceSubscribe.verified.is_(None),
+                          ServiceSubscribe.verified < now - timedelta(seconds=current_app.config['TWITTER_VERIFY_TTL']))).\
+            all()
+        verified, dead = [], []
+        for service in services:
+            try:
+                if twitter_client(service).VerifyCredentials():
+                    verified.append(service.service_subscribe_id)
+                else:
+                    dead.append(service.service_subscribe_id)
+            except TwitterError as e:
+                if twitter_auth_error(e):
+                    dead.append(service.service_subscribe_id)
+                else:
+                    # Verified again on next run
+                    logger.warning('twitter_verify %s: %s', service.service_subscribe_id, e)
+        if verified:
+            ServiceSubscribe.query.\
+                filter(ServiceSubscribe.service_subscribe_id.in_(verified)).\
+                update({ServiceSubscribe.verified: now}, synchronize_session=False)
+        if dead:
+            ServiceSubscribe.query.\
+                filter(ServiceSubscribe.service_subscribe_id.in_(dead)).\
+                update({ServiceSubscribe.alive: False}, synchronize_session=False)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        logger.exception('twitter_verify')
+        raise self.retry(exc=e)
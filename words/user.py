@@ -1,24 +1,69 @@
 from functools import wraps
+from time import time
 from urllib.parse import urlparse
 
 from sqlalchemy.exc import IntegrityError
-from flask import Blueprint, render_template, flash, session, redirect, url_for, g, abort, request
+from flask import Blueprint, render_template, flash, session, redirect, url_for, g, abort, request, current_app
 
 from words.forms import SignUpForm, SignInForm, PasswordChangeForm, service_forms
-from words.utils import generate_logotype
-from words.models import User, UserStatus, Service, ServiceSubscribe
-from words.ext import db, app_bcrypt
+from words.utils import placeholder_logotype
+from words.models import User, UserStatus, Service, ServiceSubscribe, Outbox
+from words.ext import db, password_hasher
 
 
 bp = Blueprint('user', __name__, url_prefix='/user')
 
 
+class CurrentUser:
+    """Current user built from session snapshot (user_id, username, status)
+
+    Access to other attributes load full User from database once per request.
+    """
+    def __init__(self, user_id, username, status):
+        self.__dict__.update(user_id=user_id, username=username, status=status, _user=None)
+
+    def _load(self):
+        if self._user is None:
+            user = User.query.get(self.user_id)
+            if user is None:
+                # User deleted while snapshot not expired, request repeated by anonymous
+                session.pop('user_id', None)
+                session.pop('user_snapshot', None)
+                g.user = None
+                raise abort(redirect(request.url))
+            self.__dict__['_user'] = user
+        return self._user
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __str__(self):
+        return self.username
+
+
 def load_user():
-    """Load user from database by session (if exists)"""
-    try:
-        g.user = User.query.get(session['user_id'])
-    except KeyError:
-        g.user = None
+    """Load user by session (if exists)
+
+    User stored in session as snapshot (user_id, username, status, expire time), snapshot refreshed from database by
+    light query when expired.
+    """
+    g.user = None
+    user_id = session.get('user_id')
+    if user_id is None:
+        return
+    snapshot = session.get('user_snapshot')
+    if not snapshot or snapshot[0] != user_id or snapshot[3] < time():
+        user = db.session.query(User.username, User.status).filter_by(user_id=user_id).first()
+        if user is None:
+            session.pop('user_id', None)
+            session.pop('user_snapshot', None)
+            return
+        snapshot = [user_id, user.username, user.status, time() + current_app.config['USER_SNAPSHOT_TTL']]
+        session['user_snapshot'] = snapshot
+    g.user = CurrentUser(*snapshot[:3])
 
 
 def only_for(minimal=None, maximal=None):
@@ -56,12 +101,14 @@ def sign_up():
     """Sign Up in application"""
     form = SignUpForm()
     if form.validate_on_submit():
-        logotype = generate_logotype('@{}'.format(form.username.data[0]).upper())
         try:
-            user = User(form.username.data, app_bcrypt.generate_password_hash(form.password.data), logotype)
+            user = User(form.username.data, password_hasher.generate_password_hash(form.password.data),
+                        *placeholder_logotype())
             if user.username == 'world':
                 user.status = UserStatus.ADMINISTRATOR.name
             db.session.add(user)
+            db.session.flush()
+            Outbox.add('words.tasks.logotype.generate', user.user_id, '@{}'.format(form.username.data[0]).upper())
             db.session.commit()
             flash('Registration completed! Please, save your password in safe place - we not recovery lost password!', 'warning')
             return redirect(url_for('user.sign_in'))
@@ -77,7 +124,10 @@ def sign_in():
     form = SignInForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
-        if user and app_bcrypt.check_password_hash(user.password, form.password.data):
+        if user and password_hasher.check_password_hash(user.password, form.password.data):
+            if password_hasher.needs_rehash(user.password):
+                user.password = password_hasher.generate_password_hash(form.password.data)
+                db.session.commit()
             session['user_id'] = user.user_id
             try:
                 redirect_next = request.args['next']
@@ -95,6 +145,7 @@ def sign_in():
 def sign_out():
     """Sign Out from application"""
     session.pop('user_id', None)
+    session.pop('user_snapshot', None)
     return redirect(url_for('post.posts', username=g.user.username))
 
 
@@ -104,8 +155,8 @@ def change_password():
     """Change user password"""
     form = PasswordChangeForm()
     if form.validate_on_submit():
-        if app_bcrypt.check_password_hash(g.user.password, form.old_password.data):
-            g.user.password = app_bcrypt.generate_password_hash(form.password.data)
+        if password_hasher.check_password_hash(g.user.password, form.old_password.data):
+            g.user.password = password_hasher.generate_password_hash(form.password.data)
             db.session.commit()
             return redirect(url_for('post.posts', username=g.user.username))
         else:
@@ -158,6 +209,7 @@ def service_edit(service_subscribe_id):
     if form.validate_on_submit():
         service.credentials = form.dump()
         service.alive = True
+        service.verified = None
         db.session.commit()
         return redirect(url_for('user.service_all'))
     return render_template('user/forms.html', form=form, form_title='Edit {}'.format(service.service.lower()))
@@ -1,7 +1,7 @@
-from random import randint, choice
+from random import Random, choice
+from functools import lru_cache
 from os import path, listdir
 from io import BytesIO
-from base64 import b64encode
 from xml.etree.ElementTree import ElementTree
 import warnings
 import re
@@ -14,49 +14,132 @@ import magic
 warnings.simplefilter('error', Image.DecompressionBombWarning)
 
 
+LOGOTYPE_SIZE = (512, 512)
+LOGOTYPE_SMALL_SIZE = (64, 64)
+LOGOTYPE_PALETTE_SIZE = 16
+LOGOTYPE_MIME_TYPES = ('image/jpeg', 'image/pjpeg', 'image/png', 'image/webp', )
+
+
+def encode_logotype(logotype):
+    """Encode logotype to JPG of all sizes
+
+    :param logotype: RGB image LOGOTYPE_SIZE
+    :return: (JPG bytes LOGOTYPE_SIZE, JPG bytes LOGOTYPE_SMALL_SIZE)
+    """
+    encoded = []
+    for image in (logotype, logotype.resize(LOGOTYPE_SMALL_SIZE, Image.LANCZOS)):
+        logotype_buffer = BytesIO()
+        image.save(logotype_buffer, 'jpeg', optimize=True)
+        encoded.append(logotype_buffer.getvalue())
+    return tuple(encoded)
+
+
+@lru_cache(maxsize=None)
+def logotype_fonts(font_root_path):
+    """Fonts for logotype (loaded once per process)
+
+    :param font_root_path: Directory with TrueType fonts
+    """
+    return tuple(ImageFont.truetype(path.join(font_root_path, _), 220) for _ in sorted(listdir(font_root_path)))
+
+
+@lru_cache(maxsize=None)
+def logotype_palette(base_color):
+    """Small fixed palette of background colors mixed with base color
+
+    :param base_color: (r, g, b) tuple of base color
+    """
+    palette_random = Random(sum(base_color))
+    return tuple(tuple((palette_random.randint(0, 255) + _) // 2 for _ in base_color)
+                 for _ in range(LOGOTYPE_PALETTE_SIZE))
+
+
+@lru_cache(maxsize=128)
+def logotype_glyph(text, font):
+    """Mask of text placed on logotype
+
+    :param text: text for logotype
+    :param font: Font for text
+    """
+    mask = Image.new('L', LOGOTYPE_SIZE, 0)
+    draw = ImageDraw.Draw(mask)
+    text_width, text_height = draw.textsize(text, font)
+    draw.text(((LOGOTYPE_SIZE[0] - text_width) // 2, ((LOGOTYPE_SIZE[1] - text_height) // 2) // 2), text, 255, font)
+    return mask
+
+
+@lru_cache(maxsize=256)
+def render_logotype(text, font, background_color, base_color):
+    """Render JPG logotype (rendered logotypes cached, so cache contains avatars for all initials and palette colors)
+
+    :param text: text for logotype
+    :param font: Font for text
+    :param background_color: (r, g, b) tuple of background color
+    :param base_color: (r, g, b) tuple of text color
+    :return: see encode_logotype
+    """
+    logotype = Image.new('RGB', LOGOTYPE_SIZE, background_color)
+    logotype.paste(base_color, (0, 0) + LOGOTYPE_SIZE, logotype_glyph(text, font))
+    return encode_logotype(logotype)
+
+
 def generate_logotype(text, base_color=(255, 255, 255)):
     """Generate JPG logotype from text
 
     :param text: text for logotype
     :param base_color: (r, g, b) tuple of base color
-    :return: base64 encoded logotype
+    :return: see encode_logotype
     """
-    red = (randint(0, 255) + base_color[0]) // 2
-    green = (randint(0, 255) + base_color[1]) // 2
-    blue = (randint(0, 255) + base_color[2]) // 2
+    font = choice(logotype_fonts(path.join(current_app.root_path, 'fonts')))
+    return render_logotype(text, font, choice(logotype_palette(base_color)), base_color)
 
-    font_root_path = path.join(current_app.root_path, 'fonts')
-    font = ImageFont.truetype(choice([path.join(font_root_path, _) for _ in listdir(font_root_path)]), 220)
 
-    logotype_width, logotype_height = 512, 512
-    logotype = Image.new('RGB', (logotype_width, logotype_height), (red, green, blue))
-    draw = ImageDraw.Draw(logotype, 'RGB')
-    text_width, text_height = draw.textsize(text, font)
-    draw.text(((logotype_width - text_width) // 2, ((logotype_height - text_height) // 2) // 2), text, base_color, font)
+@lru_cache(maxsize=None)
+def placeholder_logotype(color=(204, 204, 204)):
+    """Plain logotype which used while real logotype is processing
 
-    logotype_buffer = BytesIO()
-    logotype.save(logotype_buffer, 'jpeg')
-    return 'data:image/jpg;base64,{}'.format(b64encode(logotype_buffer.getvalue()).decode('utf8'))
+    :param color: (r, g, b) tuple of color
+    :return: see encode_logotype
+    """
+    return encode_logotype(Image.new('RGB', LOGOTYPE_SIZE, color))
 
 
-def resize_logotype(fp):
-    """Resize fp to JPG 512x512
+def open_logotype(fp):
+    """Check fp is supported image by header without decoding
 
     :param fp: File pointer
-    :return: base64 encoded logotype
-    :raise: ValueError - if fp not image or Decompression Bomb detected
+    :return: Not decoded image
+    :raise: ValueError - if fp not image, image more than LOGOTYPE_MAX_PIXELS or Decompression Bomb detected
     """
     try:
         mime_type = magic.from_buffer(fp.read(1024), mime=True)
         fp.seek(0)
-        if mime_type not in ['image/jpeg', 'image/pjpeg', 'image/png']:
+        if mime_type not in LOGOTYPE_MIME_TYPES:
             raise ValueError()
-        logotype_buffer = BytesIO()
-        src = Image.open(fp).resize((512, 512)).convert('RGBA')
+        src = Image.open(fp)
+        if src.width * src.height > current_app.config['LOGOTYPE_MAX_PIXELS']:
+            raise ValueError()
+        return src
+    except (IOError, Image.DecompressionBombError):
+        raise ValueError()
+
+
+def resize_logotype(fp):
+    """Resize fp to JPG logotype of all sizes
+
+    Image size checked by header before decoding, JPG decoded with reduced size (draft) if possible.
+
+    :param fp: File pointer
+    :return: see encode_logotype
+    :raise: ValueError - if fp not image, image more than LOGOTYPE_MAX_PIXELS or Decompression Bomb detected
+    """
+    src = open_logotype(fp)
+    try:
+        src.draft('RGB', LOGOTYPE_SIZE)
+        src = src.resize(LOGOTYPE_SIZE, Image.BILINEAR).convert('RGBA')
         dst = Image.new('RGB', src.size, (255, 255, 255))
         dst.paste(src, mask=src.getchannel('A'))
-        dst.save(logotype_buffer, 'jpeg')
-        return 'data:image/jpg;base64,{}'.format(b64encode(logotype_buffer.getvalue()).decode('utf8'))
+        return encode_logotype(dst)
     except (IOError, Image.DecompressionBombError):
         raise ValueError()
 